@@ -0,0 +1,78 @@
+"""
+Recall and throughput of the ANN index types in scripts.ann_index against exact
+flat search.
+
+    python -m benchmarks.ann --sizes 10000 100000 1000000
+    python -m benchmarks.ann --sizes 100000 --nprobe 8 32 --ef-search 32 128
+
+Vectors are synthetic clustered unit vectors of the MiniLM dimension (384), so
+neighbourhoods look more like sentence embeddings than uniform noise does.
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from scripts.ann_index import build_index, tune_index
+
+
+def synthetic_embeddings(n, dim, clusters, rng):
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def recall_at_k(found, truth, k):
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def timed_search(index, queries, k):
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    return found, len(queries) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=["ivf", "hnsw", "ivfpq"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--threads", type=int, default=0, help="faiss OpenMP threads (0 = library default)")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+
+    for n in args.sizes:
+        vectors = synthetic_embeddings(n, args.dim, max(10, n // 1000), rng)
+        queries = synthetic_embeddings(args.queries, args.dim, max(10, n // 1000), rng)
+        print(f"\nn={n:,} dim={args.dim} queries={args.queries} k={args.k}")
+        print(f"{'index':<8} {'param':<14} {'build s':>8} {'MiB':>8} {'recall@k':>9} {'QPS':>10}")
+
+        flat = build_index(vectors, kind="flat")
+        truth, qps = timed_search(flat, queries, args.k)
+        print(f"{'flat':<8} {'-':<14} {'-':>8} {flat.ntotal * args.dim * 4 / 2**20:8.1f} {1.0:9.3f} {qps:10.0f}")
+
+        for kind in args.types:
+            started = time.perf_counter()
+            index = build_index(vectors, kind=kind)
+            build_seconds = time.perf_counter() - started
+            size_mib = faiss.serialize_index(index).nbytes / 2**20
+            settings = [("nprobe", v) for v in args.nprobe] if kind != "hnsw" else [("efSearch", v) for v in args.ef_search]
+            for name, value in settings:
+                tune_index(index, **({"nprobe": value} if name == "nprobe" else {"ef_search": value}))
+                found, qps = timed_search(index, queries, args.k)
+                print(f"{kind:<8} {f'{name}={value}':<14} {build_seconds:8.1f} {size_mib:8.1f} "
+                      f"{recall_at_k(found, truth, args.k):9.3f} {qps:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput, memory and parity of the embedding backends in scripts.embedding_model
+on real scrape output.
+
+    python -m benchmarks.embeddings --url https://example.com
+    python -m benchmarks.embeddings --sections scraped.json --threads 4
+    python -m benchmarks.embeddings --export            # create the ONNX / int8 files first
+
+`--sections` takes the JSON that /scraped-data returns. Texts are the chunks the
+RAG pipeline would embed. Each backend runs in its own process so its peak RSS
+isn't inflated by the other; parity is the cosine similarity of every candidate
+vector to the sentence-transformers one.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from scripts.chunking import chunk_sections
+from scripts.embedding_model import EMBEDDING_MODEL_NAME, cosine_agreement, export_onnx, load_backend
+
+
+def peak_rss_mib():
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+
+        return psutil.Process().memory_info().peak_wset / 2**20
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_backend(name, model_name, threads, quantized, texts, batch_size, repeats):
+    started = time.perf_counter()
+    backend = load_backend(name, model_name, threads, **({"quantized": quantized} if name == "onnx" else {}))
+    load_seconds = time.perf_counter() - started
+    backend.encode(texts[:batch_size], batch_size)  # warm-up
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        embeddings = backend.encode(texts, batch_size)
+    per_second = len(texts) * repeats / (time.perf_counter() - started)
+    return {
+        "backend": backend.cache_key,
+        "load_seconds": load_seconds,
+        "per_second": per_second,
+        "rss_mib": peak_rss_mib(),
+        "embeddings": np.asarray(embeddings, dtype=np.float32),
+    }
+
+
+def load_texts(args):
+    if args.sections:
+        with open(args.sections, "r", encoding="utf-8") as f:
+            sections = json.load(f)
+    else:
+        from scripts.scraper import scrape_website
+
+        sections = json.loads(scrape_website(args.url))
+        if isinstance(sections, dict):
+            raise SystemExit(f"Scrape failed: {sections.get('error')}")
+    return [chunk["content"] for chunk in chunk_sections(sections)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--url")
+    source.add_argument("--sections", help="JSON file of scraped sections")
+    parser.add_argument("--export", action="store_true", help="export the ONNX and int8 models and exit")
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads per backend (0 = library default)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="fail when any vector agrees less than this")
+    args = parser.parse_args()
+
+    if args.export:
+        print(f"Exported to {export_onnx(args.model)}")
+        return
+    if not args.url and not args.sections:
+        parser.error("one of --url or --sections is required")
+
+    texts = load_texts(args)
+    print(f"{len(texts)} chunks, {sum(len(t) for t in texts):,} characters, model {args.model}")
+    print(f"{'backend':<36} {'load s':>7} {'sent/s':>9} {'peak RSS MiB':>13} {'min cos':>8} {'mean cos':>9}")
+
+    runs = [("sentence-transformers", False), ("onnx", False), ("onnx", True)]
+    reference = None
+    failed = False
+    for name, quantized in runs:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            try:
+                result = pool.submit(run_backend, name, args.model, args.threads, quantized, texts, args.batch_size, args.repeats).result()
+            except Exception as e:
+                print(f"{name + (' int8' if quantized else ''):<36} failed: {e}")
+                continue
+        parity = "-"
+        if name == "sentence-transformers":
+            reference = result["embeddings"]
+        elif reference is not None:
+            agreement = cosine_agreement(reference, result["embeddings"])
+            failed |= bool(agreement.min() < args.min_cosine)
+            parity = f"{agreement.min():8.4f} {agreement.mean():9.4f}"
+        print(f"{result['backend']:<36} {result['load_seconds']:7.1f} {result['per_second']:9.1f} "
+              f"{result['rss_mib']:13.0f} {parity:>18}")
+
+    if failed:
+        raise SystemExit(f"Parity check failed: some vectors below cosine {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Parity check and benchmark for scripts.extractor against the BeautifulSoup walk
+it replaced.
+
+    python -m benchmarks.extractor https://en.wikipedia.org/wiki/United_States
+    python -m benchmarks.extractor page.html --repeat 10
+"""
+import argparse
+import time
+
+import requests
+from bs4 import BeautifulSoup
+
+from scripts.extractor import extract_sections, etree
+
+HEADINGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+MATCHED = HEADINGS + ['p', 'span']
+
+
+def legacy_sections(html, outermost_only=False):
+    """The original scrape_website parser. With `outermost_only`, nested matches are skipped."""
+    soup = BeautifulSoup(html, "html.parser")
+    elements = soup.find_all(MATCHED)
+    sections = []
+    current_section = None
+    section_count = 0
+
+    for element in elements:
+        if outermost_only and element.find_parent(MATCHED) is not None:
+            continue
+        if element.name in HEADINGS:
+            if current_section:
+                sections.append(current_section)
+            section_count += 1
+            current_section = {
+                "id": f"section_{section_count}",
+                "content": element.get_text(" ", strip=True),
+                "links": [{"href": a.get("href"), "content": a.get_text(strip=True)} for a in element.find_all("a", href=True)]
+            }
+        else:
+            if current_section is None:
+                section_count += 1
+                current_section = {"id": f"section_{section_count}", "content": "", "links": []}
+            current_section["content"] += " " + element.get_text(" ", strip=True)
+            current_section["links"].extend(
+                [{"href": a.get("href"), "content": a.get_text(strip=True)} for a in element.find_all("a", href=True)]
+            )
+
+    if current_section:
+        sections.append(current_section)
+    return sections
+
+
+def load(source):
+    if source.startswith(("http://", "https://")):
+        response = requests.get(source, headers={"User-Agent": "Mozilla/5.0"}, timeout=30)
+        response.raise_for_status()
+        return response.text
+    with open(source, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def timed(fn, html, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(html)
+        best = min(best, time.perf_counter() - started)
+    return result, best
+
+
+def parity(reference, candidate):
+    matching = sum(1 for a, b in zip(reference, candidate) if a == b)
+    return f"{matching}/{max(len(reference), len(candidate))} sections identical"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="URL or path to an HTML file")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    html = load(args.source)
+    print(f"Input: {len(html) / 1024:.0f} KiB")
+
+    legacy, legacy_time = timed(legacy_sections, html, args.repeat)
+    deduped = legacy_sections(html, outermost_only=True)
+    print(f"{'legacy bs4/html.parser':<24} {legacy_time * 1000:9.1f} ms  {len(legacy)} sections")
+
+    backends = ["html.parser"] + (["lxml"] if etree is not None else [])
+    for backend in backends:
+        sections, elapsed = timed(lambda h: extract_sections(h, backend), html, args.repeat)
+        print(f"{'extractor/' + backend:<24} {elapsed * 1000:9.1f} ms  {len(sections)} sections  "
+              f"x{legacy_time / elapsed:.1f}  "
+              f"parity: {parity(deduped, sections)} (nested-deduplicated), {parity(legacy, sections)} (legacy)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,67 @@
 import os
 import json
 import time
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+import threading
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import subprocess
 
 # Import scripts
 from scripts.seo import analyze_seo, get_keyword_suggestions, optimize_metadata
-from scripts.scraper import scrape_website
-from scripts.rag_utils import vec_store, retrieval
-from scripts.content_update import process_update
-from scripts.content_addition import process_add
+from scripts.scrape_cache import get_scrape_cache, scrape_sections
+from scripts.embedding_model import get_embedding_model
+from scripts.llm import cache_stats as llm_cache_stats, usage as llm_usage
+from scripts.content_update import process_update, iter_update
+from scripts.content_addition import process_add, iter_add
 from scripts.error_link import process_links
+from scripts.audit import run_audit, AUDIT_STAGES
+from scripts.crawler import crawl_site, CRAWL_MAX_PAGES
+from scripts.single_flight import SingleFlight
 
 from database.websites_data import websites_bp 
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
+CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, expose_headers=["X-Fetch-Path", "X-Content-Changed"])
 
 app.register_blueprint(websites_bp)
 
-from database.conn import db
-websites_collection = db["websites"]
+# Load the embedding model in the background so the server binds right away.
+if os.getenv("EMBEDDING_WARMUP", "1") == "1":
+    get_embedding_model().warm_up()
 
-CACHE_EXPIRY_HOURS = 1  # 1 hour
+# Concurrent requests for the same analysis of the same page share one run (and its Gemini calls).
+pipelines = SingleFlight()
 
-def is_cache_valid(created_at):
-    return (datetime.now(datetime.timezone.utc) - created_at) < timedelta(hours=CACHE_EXPIRY_HOURS)
+@app.route('/health', methods=["GET"])
+def health():
+    embedding = get_embedding_model().status()
+    return jsonify({"status": "ok", "ready": embedding["ready"], "embedding_model": embedding, "llm_cache": llm_cache_stats(), "llm_usage": llm_usage.stats(), "scrape_cache": get_scrape_cache().stats(), "pipelines": pipelines.stats()})
+
+@app.route('/llm-usage', methods=["GET"])
+def llm_usage_report():
+    # Token counts and latency per LLM call, for cost and latency reporting.
+    return jsonify(llm_usage.stats(recent=True))
 
 @app.route('/scraped-data', methods=["GET"])
 def scrape():
     url = request.args.get("url")
     if not url:
         return jsonify({"error": "URL parameter is required"}), 400
+    include_changes = request.args.get("changes") == "1"
 
-    website_doc = websites_collection.find_one({"url": url})
-    if website_doc and "created_at" in website_doc:
-        if is_cache_valid(website_doc["created_at"]):
-            # Return cached scraped data if available.
-            return jsonify(website_doc.get("scrape_data", {}))
-    
-    # If not cached or expired, perform scraping.
-    result = scrape_website(url)
+    # Served from memory or Mongo while fresh, else re-checked (conditionally when validators are stored).
+    # An explicit ?mode= always scrapes the page that way.
     try:
-        data = json.loads(result)
+        page = get_scrape_cache().get(url, request.args.get("mode"))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-    websites_collection.update_one(
-        {"url": url},
-        {"$set": {
-            "scrape_data": data,
-            "created_at": datetime.utcnow()
-        }},
-        upsert=True
-    )
-    return jsonify(data)
+    data = page["sections"]
+    response = jsonify({"sections": data, "changes": page["changes"]} if include_changes else data)
+    response.headers["X-Fetch-Path"] = page["fetch_path"]
+    if not page["cached"]:
+        response.headers["X-Content-Changed"] = "true" if page["changes"]["changed"] else "false"
+    return response
 
 @app.route('/update', methods=["GET"])
 def update():
@@ -64,11 +69,7 @@ def update():
     if not url:
          return jsonify({"error": "URL parameter is required"}), 400
     try:
-        scraped = scrape_website(url)
-        if isinstance(scraped, str):
-            scraped = json.loads(scraped)
-
-        suggestions = process_update(scraped)
+        suggestions = pipelines.do(("update", url), lambda: process_update(scrape_sections(url), url=url))
         return jsonify(suggestions)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -79,32 +80,115 @@ def add():
     if not url:
          return jsonify({"error": "URL parameter is required"}), 400
     try:
-        scraped = scrape_website(url)
-        if isinstance(scraped, str):
-            scraped = json.loads(scraped)
-
-        suggestions = process_add(scraped)
+        suggestions = pipelines.do(("add", url), lambda: process_add(scrape_sections(url), url=url))
         return jsonify(suggestions)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_sections(url, iter_sections):
+    """
+    Server-Sent Events for a section analysis: a "section" event as soon as each
+    section is analysed, a "progress" event after it, and a final "summary".
+    Flask streams the response itself; sse-starlette only serves ASGI apps.
+    """
+    cancel_event = threading.Event()
+
+    def events():
+        started = time.time()
+        try:
+            scraped = scrape_sections(url)
+
+            total = len(scraped)
+            yield sse_event("progress", {"stage": "scraped", "done": 0, "total": total})
+            done = cached = errors = 0
+            for position, entry in iter_sections(scraped, url=url, cancel_event=cancel_event):
+                done += 1
+                cached += entry["cached"]
+                errors += isinstance(entry["analysis"], dict) and "error" in entry["analysis"]
+                yield sse_event("section", {"position": position, **entry})
+                yield sse_event("progress", {"stage": "analysing", "done": done, "total": total})
+            yield sse_event("summary", {
+                "total": total,
+                "analysed": done - cached,
+                "cached": cached,
+                "errors": errors,
+                "seconds": round(time.time() - started, 2),
+            })
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+        finally:
+            # Finished, or the client disconnected: drop LLM calls still queued for this stream.
+            cancel_event.set()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(events()), mimetype="text/event-stream", headers=headers)
+
+@app.route('/update/stream', methods=["GET"])
+def update_stream():
+    url = request.args.get("url")
+    if not url:
+         return jsonify({"error": "URL parameter is required"}), 400
+    return stream_sections(url, iter_update)
+
+@app.route('/add/stream', methods=["GET"])
+def add_stream():
+    url = request.args.get("url")
+    if not url:
+         return jsonify({"error": "URL parameter is required"}), 400
+    return stream_sections(url, iter_add)
+
 @app.route('/errorlink', methods=["GET"])
 def errorlink():
     url = request.args.get("url")
     if not url:
          return jsonify({"error": "URL parameter is required"}), 400
     try:
-        scraped = scrape_website(url)
-        try:
-            scraped_data = json.loads(scraped)
-        except json.JSONDecodeError:
-            return jsonify({"error": "Invalid JSON response from scraper"}), 500
-        
-        broken_links = process_links(scraped_data, base_url=url)
+        broken_links = pipelines.do(("errorlink", url), lambda: process_links(scrape_sections(url), base_url=url))
         return jsonify({"broken_links": broken_links})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/audit', methods=["GET"])
+def audit():
+    url = request.args.get("url")
+    if not url:
+         return jsonify({"error": "URL parameter is required"}), 400
+    # Scrapes and embeds the page once for every analysis instead of once per route.
+    stages = [stage for stage in request.args.get("stages", ",".join(AUDIT_STAGES)).split(",") if stage]
+    unknown = [stage for stage in stages if stage not in AUDIT_STAGES]
+    if unknown or not stages:
+        return jsonify({"error": f"stages must be a comma-separated subset of {', '.join(AUDIT_STAGES)}"}), 400
+    try:
+        stages = list(dict.fromkeys(stages))
+        report = pipelines.do(("audit", url, tuple(stages)), run_audit, url, stages)
+        return jsonify(report), 500 if "error" in report else 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/crawl', methods=["GET"])
+def crawl():
+    url = request.args.get("url")
+    sitemap = request.args.get("sitemap")
+    if not url and not sitemap:
+        return jsonify({"error": "URL or sitemap parameter is required"}), 400
+    try:
+        max_pages = int(request.args.get("max_pages", CRAWL_MAX_PAGES))
+    except ValueError:
+        return jsonify({"error": "max_pages must be an integer"}), 400
+
+    def generate():
+        # One JSON document per line, emitted as soon as each page finishes.
+        try:
+            for page in crawl_site(url, sitemap_url=sitemap, max_pages=max_pages):
+                yield json.dumps(page) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 @app.route('/seo', methods=["GET"])
 def seo():
     url = request.args.get("url")
@@ -156,7 +240,11 @@ def setup_aider():
 
 @app.route('/clear-cache', methods=["DELETE"])
 def clear_cache():
-    websites_collection.update_many({}, {"$unset": {"scrape_data": ""}})
+    url = request.args.get("url")
+    if url:
+        get_scrape_cache().invalidate(url)
+        return jsonify({"message": f"Cache cleared for {url}"})
+    get_scrape_cache().clear()
     return jsonify({"message": "Cache cleared successfully"})
 
 if __name__ == "__main__":
@@ -0,0 +1,51 @@
+import logging
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from database.conn import db
+from scripts.recrawl import section_hash
+from scripts.llm import LLM_MODEL
+
+logger = logging.getLogger(__name__)
+
+section_analyses_collection = db["section_analyses"]
+
+ANALYSIS_MODEL = LLM_MODEL
+
+def analysis_key(kind: str, section: dict) -> str:
+    """Analyses are reusable while the section's text and links are byte-for-byte the same."""
+    return f"{kind}:{ANALYSIS_MODEL}:{section_hash(section)}"
+
+def is_storable(analysis) -> bool:
+    return isinstance(analysis, (dict, list)) and not (isinstance(analysis, dict) and "error" in analysis)
+
+def load_analyses(kind: str, sections: list) -> dict:
+    """Stored analyses for these sections, as {analysis_key: analysis}."""
+    keys = list({analysis_key(kind, section) for section in sections})
+    if not keys:
+        return {}
+    try:
+        docs = section_analyses_collection.find({"_id": {"$in": keys}}, {"analysis": 1})
+        return {doc["_id"]: doc["analysis"] for doc in docs}
+    except PyMongoError as e:
+        logger.warning("Section analysis store unavailable, analysing everything: %s", e)
+        return {}
+
+def save_analyses(kind: str, analysed: list) -> None:
+    """Persist fresh [(section, analysis)] pairs; failed analyses are not stored."""
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            {"_id": analysis_key(kind, section)},
+            {"$set": {"kind": kind, "analysis": analysis, "updated_at": now}},
+            upsert=True,
+        )
+        for section, analysis in analysed
+        if is_storable(analysis)
+    ]
+    if not operations:
+        return
+    try:
+        section_analyses_collection.bulk_write(operations, ordered=False)
+    except PyMongoError as e:
+        logger.warning("Could not store section analyses: %s", e)
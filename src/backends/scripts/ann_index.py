@@ -0,0 +1,138 @@
+import logging
+import math
+import os
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "auto" picks by corpus size; "flat", "ivf", "hnsw" or "ivfpq" force a type.
+ANN_INDEX_TYPE = os.getenv("ANN_INDEX_TYPE", "auto")
+ANN_FLAT_MAX = int(os.getenv("ANN_FLAT_MAX", "20000"))
+ANN_HNSW_MAX = int(os.getenv("ANN_HNSW_MAX", "1000000"))
+ANN_COMPRESS = os.getenv("ANN_COMPRESS", "0") == "1"
+
+# Recall/latency knobs: higher nprobe / efSearch means better recall and slower queries.
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_EF_SEARCH = int(os.getenv("ANN_EF_SEARCH", "64"))
+ANN_HNSW_M = int(os.getenv("ANN_HNSW_M", "32"))
+ANN_PQ_M = int(os.getenv("ANN_PQ_M", "48"))
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+# k-means wants roughly this many training points per centroid.
+MIN_POINTS_PER_CENTROID = 39
+MAX_TRAINING_POINTS_PER_CENTROID = 256
+PQ_CENTROIDS = 256
+
+_hnsw_warned = False
+
+
+def choose_index_type(n: int, removable: bool = False) -> str:
+    """
+    Index type for a corpus of `n` vectors. `removable` excludes HNSW, which cannot
+    delete vectors, for indexes that are updated in place.
+    """
+    kind = ANN_INDEX_TYPE if ANN_INDEX_TYPE in INDEX_TYPES else "auto"
+    if kind == "auto":
+        if n <= ANN_FLAT_MAX:
+            kind = "flat"
+        elif ANN_COMPRESS or n > ANN_HNSW_MAX:
+            kind = "ivfpq"
+        else:
+            kind = "ivf" if removable else "hnsw"
+    if kind == "hnsw" and removable:
+        global _hnsw_warned
+        if not _hnsw_warned:
+            logger.warning("HNSW indexes cannot remove vectors, using IVF-Flat instead")
+            _hnsw_warned = True
+        kind = "ivf"
+    return kind
+
+
+def trainable_type(kind: str, n: int) -> str:
+    """
+    The type build_index really builds for `kind` and `n` vectors: with too few points
+    to train the coarse quantizer (or PQ codebooks), exact search is cheaper anyway.
+    """
+    min_points = MIN_POINTS_PER_CENTROID * (PQ_CENTROIDS if kind == "ivfpq" else 2)
+    if kind in ("ivf", "ivfpq") and n < min_points:
+        return "flat"
+    return kind
+
+
+def ivf_nlist(n: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_CENTROID))
+
+
+def pq_subquantizers(dim: int) -> int:
+    """Largest divisor of `dim` not above ANN_PQ_M."""
+    for m in range(min(ANN_PQ_M, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def new_index(kind: str, dim: int, n: int):
+    """An empty index of `kind` sized for about `n` vectors (untrained for IVF types)."""
+    if kind == "hnsw":
+        return faiss.IndexHNSWFlat(dim, ANN_HNSW_M)
+    if kind in ("ivf", "ivfpq"):
+        quantizer = faiss.IndexFlatL2(dim)
+        if kind == "ivf":
+            return faiss.IndexIVFFlat(quantizer, dim, ivf_nlist(n))
+        return faiss.IndexIVFPQ(quantizer, dim, ivf_nlist(n), pq_subquantizers(dim), 8)
+    return faiss.IndexFlatL2(dim)
+
+
+def build_index(vectors, kind: str = None, ids=None, removable: bool = False):
+    """
+    Build, train and fill an index for `vectors`. With `ids` the index is wrapped in
+    an IndexIDMap2 and searched results are those ids instead of row positions.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    kind = trainable_type(kind or choose_index_type(n, removable), n)
+
+    index = new_index(kind, dim, n)
+    if not index.is_trained:
+        nlist = faiss.extract_index_ivf(index).nlist
+        sample_size = min(n, max(nlist, PQ_CENTROIDS) * MAX_TRAINING_POINTS_PER_CENTROID)
+        sample = vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)] if sample_size < n else vectors
+        index.train(sample)
+    tune_index(index)
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    else:
+        index.add(vectors)
+    return index
+
+
+def base_index(index):
+    """The underlying index of an IndexIDMap/IndexIDMap2 wrapper."""
+    if hasattr(index, "id_map"):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_type(index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def tune_index(index, nprobe: int = None, ef_search: int = None):
+    """Apply search-time recall/latency settings; a no-op for exact indexes."""
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVF):
+        base.nprobe = min(nprobe or ANN_NPROBE, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search or ANN_EF_SEARCH
+    return index
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.content_addition import process_add
+from scripts.content_update import process_update
+from scripts.error_link import process_links
+from scripts.rag_utils import section_contexts
+from scripts.scrape_cache import scrape_sections
+from scripts.seo import analyze_seo, get_keyword_suggestions
+
+logger = logging.getLogger(__name__)
+
+AUDIT_STAGES = ("update", "add", "links", "seo")
+
+
+class SharedContexts:
+    """Section contexts of one page, computed (embedded and indexed) once for every stage asking for them."""
+
+    def __init__(self, sdata, url):
+        self.sdata = sdata
+        self.url = url
+        self.seconds = None
+        self._contexts = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            if self._contexts is None:
+                started = time.perf_counter()
+                self._contexts = section_contexts(self.sdata, top=3, url=self.url)
+                self.seconds = round(time.perf_counter() - started, 3)
+            return self._contexts
+
+
+def run_stage(stage, sdata, url, get_contexts, cancel_event=None):
+    if stage == "update":
+        return process_update(sdata, url=url, cancel_event=cancel_event, get_contexts=get_contexts)
+    if stage == "add":
+        return process_add(sdata, url=url, cancel_event=cancel_event, get_contexts=get_contexts)
+    if stage == "links":
+        return process_links(sdata, base_url=url, cancel_event=cancel_event, get_contexts=get_contexts)
+    if stage == "seo":
+        return {"seo_report": analyze_seo(url), "keyword_data": get_keyword_suggestions(url)}
+    raise ValueError(f"Unknown audit stage: {stage}")
+
+
+def run_audit(url, stages=AUDIT_STAGES, cancel_event=None) -> dict:
+    """
+    Full check of one page: it is scraped once (through the scrape cache), its sections are embedded and
+    indexed at most once, and the selected stages run concurrently over those
+    shared results, so link probing overlaps the LLM calls. Returns every stage's
+    result (or {"error": ...}) and the seconds spent scraping, embedding and in
+    each stage.
+    """
+    started = time.perf_counter()
+    timings = {}
+    try:
+        scraped = scrape_sections(url)
+    except Exception as e:
+        return {"url": url, "error": str(e), "timings": {"scrape": round(time.perf_counter() - started, 3)}}
+    timings["scrape"] = round(time.perf_counter() - started, 3)
+
+    get_contexts = SharedContexts(scraped, url)
+
+    def timed_stage(stage):
+        stage_started = time.perf_counter()
+        try:
+            result = run_stage(stage, scraped, url, get_contexts, cancel_event)
+        except Exception as e:
+            logger.warning("Audit stage %s failed for %s: %s", stage, url, e)
+            result = {"error": str(e)}
+        return result, round(time.perf_counter() - stage_started, 3)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(stages) or 1) as pool:
+        for stage, (result, seconds) in zip(stages, pool.map(timed_stage, stages)):
+            results[stage] = result
+            timings[stage] = seconds
+    # Part of whichever stage asked for the contexts first.
+    timings["embed"] = get_contexts.seconds
+    timings["total"] = round(time.perf_counter() - started, 3)
+    return {"url": url, "sections": len(scraped), "results": results, "timings": timings}
@@ -0,0 +1,131 @@
+import logging
+import os
+
+from scripts.chunking import count_tokens
+from scripts.llm_executor import generate_as_completed
+from scripts.structured_output import StructuredOutputError, iter_json, json_generation_config, validate
+
+logger = logging.getLogger(__name__)
+
+LLM_BATCHING_ENABLED = os.getenv("LLM_BATCHING", "1") == "1"
+# Tokens per request: instructions, sections and the answers reserved for them. A section bigger than this is sent alone.
+LLM_BATCH_TOKENS = int(os.getenv("LLM_BATCH_TOKENS", "6000"))
+# Answer tokens reserved per section, so a full batch's reply isn't cut off at the output limit.
+LLM_BATCH_OUTPUT_TOKENS = int(os.getenv("LLM_BATCH_OUTPUT_TOKENS", "150"))
+LLM_BATCH_MAX_SECTIONS = int(os.getenv("LLM_BATCH_MAX_SECTIONS", "15"))
+# Extra rounds for the sections missing or malformed in a batch response.
+LLM_BATCH_RETRIES = int(os.getenv("LLM_BATCH_RETRIES", "1"))
+
+
+def pack_batches(blocks: list, overhead: int = 0, budget: int = LLM_BATCH_TOKENS, max_items: int = LLM_BATCH_MAX_SECTIONS,
+                 output_tokens: int = LLM_BATCH_OUTPUT_TOKENS) -> list:
+    """
+    Greedily group [(id, text)] blocks, in order, into batches of ids that fit the
+    token budget, each block costing its text plus `output_tokens` for its answer.
+    """
+    batches, current, used = [], [], overhead
+    for block_id, text in blocks:
+        cost = count_tokens(text) + output_tokens
+        if current and (used + cost > budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], overhead
+        current.append(block_id)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_prompt(task: str, blocks: list, output_fields: str) -> str:
+    """One prompt for several [(id, text)] blocks; `output_fields` lists the JSON fields of one answer."""
+    sections = "\n\n".join(f"### Section {block_id}\n{text}" for block_id, text in blocks)
+    return f"""{task}
+
+You are given {len(blocks)} sections. Analyse each section on its own.
+
+{sections}
+
+Respond ONLY with a JSON array holding exactly one object per section, in this format:
+[
+  {{
+    "id": "the section id",
+    {output_fields}
+  }}
+]
+"""
+
+
+def parse_batch(text: str, ids: list, model_cls) -> dict:
+    """
+    {id: analysis} for every answer object in the response that was asked for and
+    matches `model_cls`. Objects are read one by one, so those that arrived whole
+    are kept when the array was cut off; a one-section batch may be answered with
+    a bare object.
+    """
+    wanted = set(ids)
+    parsed = {}
+    for item in iter_json(text, "{"):
+        if not isinstance(item, dict):
+            continue
+        if "id" not in item and len(ids) == 1:
+            item = {**item, "id": ids[0]}
+        if str(item.get("id")) not in wanted:
+            continue
+        try:
+            parsed[str(item["id"])] = validate(model_cls, {k: v for k, v in item.items() if k != "id"})
+        except StructuredOutputError:
+            continue
+    return parsed
+
+
+def split_batch(batch: list) -> list:
+    """A batch in two halves, or as it is when it holds one id."""
+    if len(batch) < 2:
+        return [batch]
+    middle = (len(batch) + 1) // 2
+    return [batch[:middle], batch[middle:]]
+
+
+def iter_batches(task: str, blocks: list, output_fields: str, model_cls, cancel_event=None, generate_stream=generate_as_completed):
+    """
+    Analyse [(id, text)] blocks with as few requests as the token budget allows,
+    sending the batches of a round concurrently. Yields (id, analysis, error) for
+    each block as soon as its batch is answered; analysis is None and error says
+    why for blocks that finally failed.
+
+    Sections missing from a response, or failing the schema, are retried up to
+    LLM_BATCH_RETRIES times, each batch's failures split in two halves so a reply
+    that was cut off isn't asked for at the same length again; the others are never
+    re-sent. Failed calls were already retried by the executor and are reported as
+    they are.
+    """
+    texts = dict(blocks)
+    overhead = count_tokens(batch_prompt(task, [], output_fields))
+    batches = pack_batches(blocks, overhead)
+
+    for attempt in range(LLM_BATCH_RETRIES + 1):
+        last = attempt == LLM_BATCH_RETRIES
+        failed = []
+        prompts = [batch_prompt(task, [(i, texts[i]) for i in batch], output_fields) for batch in batches]
+        for index, response in generate_stream(prompts, cancel_event, generation_config=json_generation_config()):
+            batch = batches[index]
+            if isinstance(response, Exception):
+                for block_id in batch:
+                    yield block_id, None, str(response)
+                continue
+            parsed = parse_batch(response, batch, model_cls)
+            message = "Section missing or invalid in batched Gemini response"
+            missing = []
+            for block_id in batch:
+                if block_id in parsed:
+                    yield block_id, parsed[block_id], None
+                elif last:
+                    yield block_id, None, message
+                else:
+                    missing.append(block_id)
+            if missing:
+                failed.append(missing)
+        if not failed:
+            break
+        logger.info("Retrying %d of %d sections after a partial batch response", sum(map(len, failed)), len(blocks))
+        batches = [half for missing in failed for half in split_batch(missing)]
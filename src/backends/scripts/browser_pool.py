@@ -0,0 +1,150 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from playwright.sync_api import sync_playwright
+
+from scripts.http_utils import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "50"))
+BROWSER_ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", "120"))
+
+
+class BrowserPool:
+    """
+    A fixed number of warm headless Chromium browsers.
+
+    Playwright's sync API is bound to the thread that started it, so each
+    browser is owned by its own worker thread and jobs are handed over a queue.
+    The number of workers caps how many pages render at once. Every job gets a
+    fresh, isolated browser context, and a browser is relaunched when it
+    disconnects or after it has served `max_pages` pages.
+    """
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_pages=BROWSER_MAX_PAGES, user_agent=USER_AGENT):
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.user_agent = user_agent
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._pages_served = 0
+        self._relaunches = 0
+        self._workers = []
+        for i in range(self.size):
+            worker = threading.Thread(target=self._worker, name=f"browser-pool-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def run(self, fn, timeout=BROWSER_ACQUIRE_TIMEOUT):
+        """
+        Run `fn(page)` on a pooled browser and return its result.
+        `timeout` covers both waiting for a free browser and running `fn`.
+        """
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        future = Future()
+        self._jobs.put((fn, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Browser pool job did not finish within {timeout}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "alive_workers": sum(1 for w in self._workers if w.is_alive()),
+                "queued_jobs": self._jobs.qsize(),
+                "pages_served": self._pages_served,
+                "relaunches": self._relaunches,
+            }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join(timeout=10)
+
+    def _launch(self, playwright, browser):
+        if browser is not None:
+            try:
+                browser.close()
+            except Exception:
+                pass
+        with self._lock:
+            self._relaunches += 1
+        return playwright.chromium.launch(headless=True)
+
+    def _worker(self):
+        playwright = None
+        browser = None
+        served = 0
+
+        def ensure_browser():
+            nonlocal playwright, browser, served
+            if playwright is None:
+                playwright = sync_playwright().start()
+            if browser is None or not browser.is_connected() or served >= self.max_pages:
+                browser = self._launch(playwright, browser)
+                served = 0
+
+        try:
+            ensure_browser()
+        except Exception as e:
+            logger.warning("Browser warm-up failed, retrying on first job: %s", e)
+
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    break
+                fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    ensure_browser()
+                    context = browser.new_context(user_agent=self.user_agent)
+                    try:
+                        result = fn(context.new_page())
+                    finally:
+                        context.close()
+                        served += 1
+                        with self._lock:
+                            self._pages_served += 1
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            if browser is not None:
+                try:
+                    browser.close()
+                except Exception:
+                    pass
+            if playwright is not None:
+                playwright.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Return the process-wide browser pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+import zlib
+
+import numpy as np
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces; word-level counts run a little low, so stay under it.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+MERSENNE_PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.int64)
+_PERM_B = _rng.integers(0, MERSENNE_PRIME, MINHASH_PERMUTATIONS, dtype=np.int64)
+
+
+def count_tokens(text: str) -> int:
+    """Approximate model tokens: words and punctuation marks."""
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def split_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> list:
+    """Split text on word boundaries into pieces of at most `max_tokens`, each repeating `overlap` tokens of the last."""
+    words = text.split()
+    if not words:
+        return []
+    costs = [max(1, count_tokens(word)) for word in words]
+    if sum(costs) <= max_tokens:
+        return [" ".join(words)]
+
+    pieces = []
+    start = 0
+    while start < len(words):
+        end, used = start, 0
+        while end < len(words) and (used + costs[end] <= max_tokens or end == start):
+            used += costs[end]
+            end += 1
+        pieces.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # Step back over `overlap` tokens, but always move forward.
+        back, carried = end, 0
+        while back > start + 1 and carried + costs[back - 1] <= overlap:
+            back -= 1
+            carried += costs[back]
+        start = back
+    return pieces
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of whole words within `max_tokens`, marked with an ellipsis (one token) when cut."""
+    words = text.split()
+    costs = [max(1, count_tokens(word)) for word in words]
+    if sum(costs) <= max_tokens:
+        return text
+    used = 0
+    for n, cost in enumerate(costs):
+        used += cost
+        if used > max_tokens - 1:
+            return " ".join(words[:n] + ["\u2026"])
+    return text
+
+
+def fit_to_budget(texts: list, budget: int, separator: str = "\n\n", min_piece: int = 20) -> str:
+    """
+    Join `texts`, most relevant first, within `budget` tokens. The text that
+    overflows is truncated when at least `min_piece` tokens of budget are left,
+    and everything after it is dropped. A budget of 0 means no limit.
+    """
+    if budget <= 0:
+        return separator.join(texts)
+    kept, used = [], 0
+    for text in texts:
+        cost = count_tokens(text)
+        if used + cost <= budget:
+            kept.append(text)
+            used += cost
+            continue
+        if budget - used >= min_piece:
+            kept.append(truncate_tokens(text, budget - used))
+        break
+    return separator.join(kept)
+
+
+def chunk_sections(sections: list, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS) -> list:
+    """Token-bounded chunks of every section, as [{"id", "section_id", "content"}]."""
+    chunks = []
+    for section in sections:
+        for n, piece in enumerate(split_text(section.get("content", ""), max_tokens, overlap)):
+            chunks.append({"id": f"{section['id']}#{n}", "section_id": section["id"], "content": piece})
+    return chunks
+
+
+def _normalized_words(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    words = _normalized_words(text)
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.int64) % MERSENNE_PRIME
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+
+def dedupe_chunks(chunks: list, threshold: float = NEAR_DUPLICATE_THRESHOLD):
+    """
+    Drop exact and near-duplicate chunks (boilerplate such as navigation, footers and
+    cookie banners). Near duplicates are found with MinHash signatures bucketed by LSH
+    bands and confirmed by estimated Jaccard similarity >= `threshold`.
+
+    Returns (kept_chunks, duplicate_of) where duplicate_of maps each dropped chunk id
+    to the id of the kept chunk it duplicates.
+    """
+    kept, duplicate_of = [], {}
+    exact = {}
+    buckets = {}
+    signatures = {}
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+
+    for chunk in chunks:
+        digest = hashlib.sha1(" ".join(_normalized_words(chunk["content"])).encode("utf-8")).digest()
+        if digest in exact:
+            duplicate_of[chunk["id"]] = exact[digest]
+            continue
+
+        signature = minhash_signature(chunk["content"])
+        bands = [(b, signature[b * rows:(b + 1) * rows].tobytes()) for b in range(LSH_BANDS)]
+        candidates = dict.fromkeys(cid for band in bands for cid in buckets.get(band, ()))
+        match = next(
+            (cid for cid in candidates if np.mean(signatures[cid] == signature) >= threshold),
+            None,
+        )
+        if match is not None:
+            duplicate_of[chunk["id"]] = match
+            continue
+
+        exact[digest] = chunk["id"]
+        signatures[chunk["id"]] = signature
+        for band in bands:
+            buckets.setdefault(band, []).append(chunk["id"])
+        kept.append(chunk)
+    return kept, duplicate_of
+
@@ -1,12 +1,9 @@
 import json
-import os
-import re
-import google.generativeai as genai
-from dotenv import load_dotenv
-from scripts.rag_utils import vec_store, retrieval
+from scripts.structured_output import AdditionAnalysis, iter_structured
+from scripts.rag_utils import section_contexts
+from scripts.analysis_store import analysis_key, load_analyses, save_analyses
+from scripts.batch_analysis import LLM_BATCHING_ENABLED, iter_batches
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
 def load_data(file_path):
     with open(file_path, "r", encoding="utf-8") as f:
@@ -44,53 +41,93 @@ def gen_prompt(text, links, context):
 
 
 
-def query_gemini(prompt):
+TASK = (
+    "You are a helpful assistant that improves the reliability and authenticity of web content. "
+    "For each section, suggest additional information that could improve trust, clarity, and authenticity of its content. "
+    "Focus on data, citations, expert opinions, historical background, or any other useful enhancements."
+)
+OUTPUT_FIELDS = '''"suggestions": [
+      {
+        "addition": "A sentence or paragraph suggestion.",
+        "reason": "Why this improves reliability or authenticity."
+      }
+    ]'''
+OUTPUT_MODEL = AdditionAnalysis
+
+def section_block(text, links, context):
+    """The per-section part of gen_prompt, for batched prompts."""
+    link_str = "\n".join([f"- {l['content']} ({l['href']})" for l in links]) if links else "None"
+    return f"""Context from related documents:
+\"\"\"{context}\"\"\"
+
+Current content:
+\"\"\"{text}\"\"\"
+
+Links currently in the content:
+{link_str}"""
+
+
+
+
+def stream_analyses(pending, contexts, cancel_event=None):
+    """Yield (position, analysis) for [(position, section)] as soon as each Gemini call finishes."""
+    if LLM_BATCHING_ENABLED:
+        # As many sections per Gemini call as fit the token budget; only failed ones are re-sent.
+        positions = {item["id"]: position for position, item in pending}
+        blocks = [(item["id"], section_block(item["content"], item.get("links", []), contexts[position])) for position, item in pending]
+        for section_id, analysis, error in iter_batches(TASK, blocks, OUTPUT_FIELDS, OUTPUT_MODEL, cancel_event):
+            yield positions[section_id], analysis if analysis is not None else {"outdated": False, "error": error}
+        return
+
+    prompts = [gen_prompt(item["content"], item.get("links", []), contexts[position]) for position, item in pending]
+    # Only replies that fail the schema are asked again.
+    for index, analysis, error in iter_structured(prompts, OUTPUT_MODEL, cancel_event=cancel_event):
+        yield pending[index][0], analysis if analysis is not None else {"outdated": False, "error": error}
+
+
+def section_result(item, analysis, cached):
+    return {
+        "id": item["id"],
+        "orignal_content": item["content"],
+        "links": item.get("links", []),
+        "analysis": analysis,
+        "cached": cached
+    }
+
+
+def iter_add(sdata, url=None, cancel_event=None, get_contexts=None):
+    """
+    Yield (position, result) for every section as soon as its analysis is ready:
+    stored analyses first, then fresh ones in completion order. `get_contexts`
+    returns the section contexts when another analysis of the page shares them.
+    """
+    # Sections whose text and links are unchanged since a previous run reuse the stored analysis.
+    stored = load_analyses("add", sdata)
+    pending = []
+    for position, item in enumerate(sdata):
+        key = analysis_key("add", item)
+        if key in stored:
+            yield position, section_result(item, stored[key], True)
+        else:
+            pending.append((position, item))
+    if not pending:
+        return
+
+    contexts = get_contexts() if get_contexts else section_contexts(sdata, top=3, url=url)
+    fresh = []
     try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(prompt)
-        content = response.text.strip()
-
-        json_matches = re.findall(r'{[\s\S]*?}', content)
-        for match in json_matches:
-            try:
-                return json.loads(match)
-            except json.JSONDecodeError:
-                continue
-        return {
-            "outdated": False,
-            "error": "No valid JSON object found in Gemini response"
-        }
-        
-    except Exception as e:
-        return json.dumps({
-            "outdated": False,
-            "error": str(e)
-        })
-
-
-def process_add(sdata):
-    index, embeddings, texts = vec_store(sdata)
-    result = []
-
-
-    for item in sdata:
-        try:
-            context = retrieval(index, embeddings, texts, item["content"], top=3)
-            prompt = gen_prompt(item["content"], item.get("links", []), context)
-            sugesstion_json = query_gemini(prompt)
-            sugesstion = sugesstion_json
-        except Exception as e:
-            sugesstion = {
-                "outdated": False,
-                "error": str(e)
-            }
-
-        result.append({
-            "id": item["id"],
-            "orignal_content": item["content"],
-            "links": item.get("links", []),
-            "analysis": sugesstion
-        })
+        for position, analysis in stream_analyses(pending, contexts, cancel_event):
+            fresh.append((sdata[position], analysis))
+            yield position, section_result(sdata[position], analysis, False)
+    finally:
+        # Whatever finished before a cancellation is kept for next time.
+        save_analyses("add", fresh)
+
+
+def process_add(sdata, url=None, cancel_event=None, get_contexts=None):
+    result = [None] * len(sdata)
+    for position, entry in iter_add(sdata, url=url, cancel_event=cancel_event, get_contexts=get_contexts):
+        result[position] = entry
     return result
 
 
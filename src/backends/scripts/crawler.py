@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib import robotparser
+from urllib.parse import urlparse
+
+import requests
+
+from scripts.http_utils import USER_AGENT, HostLimiter
+from scripts.scrape_cache import scrape_sections
+from scripts.url_utils import normalize_url, url_host
+
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "2"))
+CRAWL_POLITENESS_DELAY = float(os.getenv("CRAWL_POLITENESS_DELAY", "1.0"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "100"))
+
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".zip", ".gz", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp",
+    ".ico", ".mp3", ".mp4", ".avi", ".mov", ".css", ".js", ".xml", ".json",
+)
+
+
+class Frontier:
+    """Deduplicated FIFO of normalized URLs, capped at `max_pages` admissions."""
+
+    def __init__(self, max_pages):
+        self.max_pages = max_pages
+        self._queue = deque()
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def add(self, url) -> bool:
+        with self._lock:
+            if url in self._seen or len(self._seen) >= self.max_pages:
+                return False
+            self._seen.add(url)
+            self._queue.append(url)
+            return True
+
+    def pop(self):
+        with self._lock:
+            return self._queue.popleft() if self._queue else None
+
+
+def read_sitemap(url: str, max_depth=2) -> list:
+    """Page URLs listed in a sitemap.xml, following nested sitemap indexes."""
+    response = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=15)
+    response.raise_for_status()
+    root = ET.fromstring(response.content)
+
+    urls = []
+    for element in root.iter():
+        if not element.tag.endswith("loc") or not element.text:
+            continue
+        loc = element.text.strip()
+        if root.tag.endswith("sitemapindex"):
+            if max_depth > 0:
+                try:
+                    urls.extend(read_sitemap(loc, max_depth - 1))
+                except (requests.RequestException, ET.ParseError):
+                    continue
+        else:
+            urls.append(loc)
+    return urls
+
+
+class SiteCrawler:
+    def __init__(self, max_pages=CRAWL_MAX_PAGES, concurrency=CRAWL_CONCURRENCY,
+                 per_host=CRAWL_PER_HOST_CONCURRENCY, delay=CRAWL_POLITENESS_DELAY,
+                 same_host=True, follow_links=True, respect_robots=True):
+        self.frontier = Frontier(max_pages)
+        self.limiter = HostLimiter(per_host, delay)
+        self.concurrency = concurrency
+        self.same_host = same_host
+        self.follow_links = follow_links
+        self.respect_robots = respect_robots
+        self._robots = {}
+        self._robots_lock = threading.Lock()
+        self._hosts = set()
+
+    def crawl(self, seed_url: str, sitemap_url: str = None):
+        """
+        Yield one result per page, in completion order:
+        {"url", "sections"} on success or {"url", "error"} on failure.
+        """
+        seeds = [seed_url] if seed_url else []
+        if sitemap_url:
+            seeds += read_sitemap(sitemap_url)
+        for url in seeds:
+            url = normalize_url(url)
+            if url:
+                self._hosts.add(url_host(url))
+                self.frontier.add(url)
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        pending = set()
+        try:
+            while True:
+                while len(pending) < self.concurrency:
+                    url = self.frontier.pop()
+                    if url is None:
+                        break
+                    pending.add(executor.submit(self._fetch, url))
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result, discovered = future.result()
+                    for link in discovered:
+                        self.frontier.add(link)
+                    yield result
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _fetch(self, url):
+        started = time.time()
+        if not self._allowed(url):
+            return {"url": url, "error": "Disallowed by robots.txt"}, []
+
+        host = url_host(url)
+        self.limiter.acquire(host)
+        try:
+            data = scrape_sections(url)
+        except Exception as e:
+            data = {"error": str(e)}
+        finally:
+            self.limiter.release(host)
+
+        elapsed = round(time.time() - started, 3)
+        if isinstance(data, dict) and "error" in data:
+            return {"url": url, "error": data["error"], "elapsed_seconds": elapsed}, []
+        return {"url": url, "sections": data, "elapsed_seconds": elapsed}, self._discover(url, data)
+
+    def _discover(self, page_url, sections):
+        if not self.follow_links:
+            return []
+        links = []
+        for section in sections:
+            for link in section.get("links", []):
+                url = normalize_url(link.get("href"), page_url)
+                if not url or urlparse(url).path.lower().endswith(SKIPPED_EXTENSIONS):
+                    continue
+                if self.same_host and url_host(url) not in self._hosts:
+                    continue
+                links.append(url)
+        return links
+
+    def _allowed(self, url):
+        if not self.respect_robots:
+            return True
+        host = url_host(url)
+        with self._robots_lock:
+            parser = self._robots.get(host)
+            if parser is None:
+                parser = robotparser.RobotFileParser()
+                parsed = urlparse(url)
+                parser.set_url(f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+                try:
+                    response = requests.get(parser.url, headers={"User-Agent": USER_AGENT}, timeout=10)
+                    parser.parse(response.text.splitlines() if response.status_code == 200 else [])
+                except requests.RequestException:
+                    parser.parse([])
+                self._robots[host] = parser
+        return parser.can_fetch(USER_AGENT, url)
+
+
+def crawl_site(seed_url: str, sitemap_url: str = None, **options):
+    """Crawl a site from a seed URL and/or sitemap, yielding per-page results as they finish."""
+    return SiteCrawler(**options).crawl(seed_url, sitemap_url)
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache_dir", "embeddings"),
+)
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "100000"))
+
+DIGEST_SIZE = 20
+SQL_BATCH = 500
+
+
+def text_digest(text: str) -> bytes:
+    """Hash of the text with whitespace runs collapsed, so re-scrapes with different spacing still hit."""
+    normalized = " ".join(text.split())
+    return hashlib.sha1(normalized.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent float32 embedding store for one model.
+
+    Vectors live in a fixed-capacity memory-mapped matrix; a SQLite table maps text
+    hashes to rows and tracks last use for LRU eviction once the matrix is full.
+    A parallel array records which hash currently owns each row. Writers clear it
+    before overwriting a row and set it afterwards, and readers check it on both
+    sides of the copy, so a reader racing an eviction sees a miss, never a wrong vector.
+    """
+
+    def __init__(self, model_name: str, dim: int, capacity: int = EMBEDDING_CACHE_MAX_ROWS, directory: str = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', model_name)}-{dim}-{capacity}")
+        self._db_path = base + ".sqlite"
+        self._vectors = self._open_memmap(base + ".f32", np.float32, (capacity, dim))
+        self._owners = self._open_memmap(base + ".owners", np.uint8, (capacity, DIGEST_SIZE))
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (digest BLOB PRIMARY KEY, row INTEGER UNIQUE NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    @staticmethod
+    def _open_memmap(path, dtype, shape):
+        # Grow the file in place rather than opening with "w+", which would truncate it under other processes.
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _connect(self):
+        return sqlite3.connect(self._db_path, timeout=30)
+
+    def get_many(self, texts: list):
+        """Returns ({position: vector} for cached texts, [positions of missing texts])."""
+        digests = [text_digest(text) for text in texts]
+        rows = {}
+        unique = list(set(digests))
+        with self._connect() as conn:
+            for start in range(0, len(unique), SQL_BATCH):
+                chunk = unique[start:start + SQL_BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                rows.update(conn.execute(f"SELECT digest, row FROM entries WHERE digest IN ({placeholders})", chunk).fetchall())
+
+        found, missing, used = {}, [], []
+        for position, digest in enumerate(digests):
+            row = rows.get(digest)
+            vector = self._read(row, digest) if row is not None else None
+            if vector is None:
+                missing.append(position)
+            else:
+                found[position] = vector
+                used.append(digest)
+
+        if used:
+            now = time.time()
+            with self._connect() as conn:
+                conn.executemany("UPDATE entries SET last_used = ? WHERE digest = ?", [(now, d) for d in set(used)])
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def _read(self, row, digest):
+        if self._owners[row].tobytes() != digest:
+            return None
+        vector = np.array(self._vectors[row])
+        return vector if self._owners[row].tobytes() == digest else None
+
+    def put_many(self, texts: list, vectors) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        pending = {}
+        for text, vector in zip(texts, vectors):
+            pending[text_digest(text)] = vector
+        if not pending:
+            return
+
+        with self._lock, self._connect() as conn:
+            # IMMEDIATE takes the write lock up front, serialising writers across processes.
+            conn.execute("BEGIN IMMEDIATE")
+            existing = set()
+            digests = list(pending)
+            for start in range(0, len(digests), SQL_BATCH):
+                chunk = digests[start:start + SQL_BATCH]
+                placeholders = ",".join("?" * len(chunk))
+                existing.update(d for (d,) in conn.execute(f"SELECT digest FROM entries WHERE digest IN ({placeholders})", chunk))
+            new = [d for d in digests if d not in existing][:self.capacity]
+            if not new:
+                return
+
+            used = conn.execute("SELECT COUNT(*), COALESCE(MAX(row), -1) FROM entries").fetchone()
+            free_rows = list(range(used[1] + 1, min(self.capacity, used[1] + 1 + len(new))))
+            shortfall = len(new) - len(free_rows)
+            if shortfall > 0:
+                evicted = conn.execute("SELECT digest, row FROM entries ORDER BY last_used LIMIT ?", (shortfall,)).fetchall()
+                conn.executemany("DELETE FROM entries WHERE digest = ?", [(d,) for d, _ in evicted])
+                free_rows += [row for _, row in evicted]
+
+            now = time.time()
+            for digest, row in zip(new, free_rows):
+                self._owners[row] = 0
+                self._vectors[row] = pending[digest]
+                self._owners[row] = np.frombuffer(digest, dtype=np.uint8)
+            self._vectors.flush()
+            self._owners.flush()
+            conn.executemany(
+                "INSERT INTO entries (digest, row, last_used) VALUES (?, ?, ?)",
+                [(digest, row, now) for digest, row in zip(new, free_rows)],
+            )
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            size = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"model": self.model_name, "entries": size, "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str, dim: int) -> EmbeddingCache:
+    key = (model_name, dim)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(model_name, dim)
+        return _caches[key]
@@ -0,0 +1,277 @@
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-l6-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Intra-op CPU threads for the model; 0 keeps the library default.
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+# "sentence-transformers" (PyTorch) or "onnx" (ONNX Runtime, int8 by default).
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_ONNX_DIR = os.getenv(
+    "EMBEDDING_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache_dir", "onnx"),
+)
+EMBEDDING_ONNX_QUANTIZED = os.getenv("EMBEDDING_ONNX_QUANTIZED", "1") == "1"
+# MiniLM was trained on 256 word pieces; sentence-transformers truncates there too.
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "256"))
+
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+
+
+def onnx_model_dir(model_name: str, directory: str = EMBEDDING_ONNX_DIR) -> str:
+    return os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+
+
+class SentenceTransformerBackend:
+    """The reference backend: the sentence-transformers model on PyTorch."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name, device=EMBEDDING_DEVICE, threads=EMBEDDING_THREADS):
+        from sentence_transformers import SentenceTransformer
+
+        if threads > 0:
+            import torch
+
+            torch.set_num_threads(threads)
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+
+    @property
+    def cache_key(self) -> str:
+        return self.model_name
+
+    def encode(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class OnnxBackend:
+    """
+    The same transformer exported to ONNX (see export_onnx) and run with ONNX Runtime
+    on CPU, optionally with int8 dynamically quantized weights. Mean pooling and L2
+    normalisation reproduce the sentence-transformers pipeline of MiniLM.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_name, threads=EMBEDDING_THREADS, quantized=EMBEDDING_ONNX_QUANTIZED, directory=EMBEDDING_ONNX_DIR):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = onnx_model_dir(model_name, directory)
+        path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No ONNX export at {path}; create it with scripts.embedding_model.export_onnx()")
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.model_name = model_name
+        self.quantized = quantized
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(EMBEDDING_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+        self._dim = self.session.get_outputs()[0].shape[-1]
+
+    @property
+    def cache_key(self) -> str:
+        # int8 vectors differ slightly from the reference, so they never share cache entries.
+        return f"{self.model_name}-onnx{'-int8' if self.quantized else ''}"
+
+    def encode(self, texts, batch_size=EMBEDDING_BATCH_SIZE):
+        embeddings = np.zeros((len(texts), self._dim), dtype=np.float32)
+        # Batching texts of similar length keeps padding, and wasted compute, low.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encoded = self.tokenizer.encode_batch([texts[i] for i in batch])
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            hidden = self.session.run(None, feeds)[0]
+            embeddings[batch] = mean_pool(hidden, attention_mask)
+        return embeddings
+
+    def dimension(self) -> int:
+        return self._dim
+
+
+def mean_pool(hidden, attention_mask):
+    """Mean of the token vectors that aren't padding, L2-normalised."""
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+
+def cosine_agreement(reference, candidate):
+    """Row-wise cosine similarity between two embedding matrices of the same texts."""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    dot = (reference * candidate).sum(axis=1)
+    norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    return dot / np.clip(norms, 1e-12, None)
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL_NAME, directory: str = EMBEDDING_ONNX_DIR, quantize: bool = True) -> str:
+    """
+    Export the transformer of a sentence-transformers model to ONNX, plus an int8
+    dynamically quantized copy, for OnnxBackend. Needs PyTorch and onnxruntime;
+    the serving process then needs only onnxruntime and tokenizers.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    model = SentenceTransformer(model_name, device="cpu")
+    model_dir = onnx_model_dir(model_name, directory)
+    os.makedirs(model_dir, exist_ok=True)
+    model.tokenizer.save_pretrained(model_dir)
+
+    sample = model.tokenizer(["An example sentence to trace the model with."], return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    path = os.path.join(model_dir, ONNX_FILE)
+    torch.onnx.export(
+        HiddenStates(model[0].auto_model).eval(),
+        tuple(sample[name] for name in names),
+        path,
+        input_names=names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+        opset_version=14,
+    )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(path, os.path.join(model_dir, ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+    return model_dir
+
+
+BACKENDS = {SentenceTransformerBackend.name: SentenceTransformerBackend, OnnxBackend.name: OnnxBackend}
+
+
+def load_backend(name: str, model_name: str = EMBEDDING_MODEL_NAME, threads: int = EMBEDDING_THREADS, **options):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](model_name, threads=threads, **options)
+
+
+class EmbeddingModelManager:
+    """
+    Loads the sentence embedding backend once per process, on first use or from a
+    background warm-up thread, so importing the RAG modules does not pull in
+    PyTorch. Concurrent callers wait on the same load instead of loading twice.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND, threads=EMBEDDING_THREADS, batch_size=EMBEDDING_BATCH_SIZE):
+        self.model_name = model_name
+        self.backend = backend
+        self.threads = threads
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._model = None
+        self._state = "idle"
+        self._error = None
+        self._load_seconds = None
+        self._warmup = None
+
+    def get(self):
+        """The loaded backend, loading it in the calling thread if nobody has yet."""
+        model = self._model
+        if model is not None:
+            return model
+        with self._lock:
+            if self._model is None:
+                self._load()
+            return self._model
+
+    def _load(self):
+        self._state = "loading"
+        started = time.perf_counter()
+        try:
+            model = load_backend(self.backend, self.model_name, self.threads)
+        except Exception as e:
+            self._state = "failed"
+            self._error = str(e)
+            raise
+        self._load_seconds = round(time.perf_counter() - started, 3)
+        self._error = None
+        self._model = model
+        self._state = "ready"
+        logger.info("Loaded embedding model %s (%s) in %ss", self.model_name, self.backend, self._load_seconds)
+
+    def warm_up(self):
+        """Start loading the model in a background thread; returns immediately."""
+        with self._lock:
+            if self._model is not None or (self._warmup is not None and self._warmup.is_alive()):
+                return
+            self._warmup = threading.Thread(target=self._warm_up, name="embedding-warmup", daemon=True)
+            self._warmup.start()
+
+    def _warm_up(self):
+        try:
+            self.get()
+        except Exception:
+            logger.exception("Embedding model warm-up failed")
+
+    def encode(self, texts, batch_size=None):
+        return self.get().encode(texts, batch_size=batch_size or self.batch_size)
+
+    def dimension(self) -> int:
+        return self.get().dimension()
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vectors this model produces, for the embedding cache and site indexes."""
+        return self.get().cache_key
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def status(self) -> dict:
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "state": self._state,
+            "ready": self.ready,
+            "load_seconds": self._load_seconds,
+            "error": self._error,
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_embedding_model() -> EmbeddingModelManager:
+    """Return the process-wide embedding model manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = EmbeddingModelManager()
+        return _manager
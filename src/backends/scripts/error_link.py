@@ -1,47 +1,9 @@
-import os
-import json
-import requests
-from urllib.parse import urlparse, urljoin
-import google.generativeai as genai
-from dotenv import load_dotenv
-from scripts.rag_utils import vec_store, retrieval
+from scripts.link_checker import find_broken_links
+from scripts.link_store import cached_check_urls
+from scripts.structured_output import LinkSuggestion, iter_structured
+from scripts.rag_utils import section_contexts
 
-load_dotenv()
-
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-def check_broken_links(scraped_data, base_url):
-    if isinstance(scraped_data, str):
-        scraped_data = json.loads(scraped_data)
-    
-    broken_links = []
-    
-    for section in scraped_data:
-        if not isinstance(section, dict):  
-            continue  # Skip invalid sections
-
-        for link in section.get("links", []):
-            if not isinstance(link, dict):  
-                continue  # Skip invalid links
-
-            href = link.get("href")
-            if not href:
-                continue  # Skip empty links
-
-            # Convert relative URLs to absolute URLs
-            if base_url and not urlparse(href).netloc:
-                href = urljoin(base_url, href)
-
-            try:
-                response = requests.head(href, allow_redirects=True, timeout=5)
-                if response.status_code >= 400:
-                    broken_links.append(href)
-            except requests.RequestException:
-                broken_links.append(href)
-
-    print(broken_links)
-
-def gen_prompt(broken_links, context="Wikipedia or general knowledge"):
+def link_prompt(broken_links, context="Wikipedia or general knowledge"):
     links_formatted = "\n".join([f"- {link['content']}: {link['href']}" for link in broken_links])
     
     prompt = f"""
@@ -63,46 +25,48 @@ def gen_prompt(broken_links, context="Wikipedia or general knowledge"):
         }}
         ]
         """
-    try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(prompt)
-        content = response.text.strip()
+    return prompt
 
-        json_matches = json.loads(content)
-        return json_matches
-
-    except Exception as e:
-        return [{"error": str(e)}]
 
+def process_links(sdata, base_url=None, cancel_event=None, get_contexts=None):
+    contexts = get_contexts() if get_contexts else section_contexts(sdata, top=3, url=base_url)
+    checked = []
 
-def process_links(sdata, base_url=None):
-    index, embeddings, texts = vec_store(sdata)
+    # Every distinct URL on the page is checked once, then mapped back to its sections.
+    try:
+        broken_by_section = find_broken_links(sdata, base_url, check=cached_check_urls)
+    except Exception as e:
+        broken_by_section = [e] * len(sdata)
+
+    for position, item in enumerate(sdata):
+        broken_links = broken_by_section[position]
+        if isinstance(broken_links, Exception):
+            checked.append((position, item, None, broken_links))
+        else:
+            checked.append((position, item, broken_links, None))
+
+    # Suggestions for every section with broken links are requested concurrently.
+    asking = [position for position, _, broken_links, _ in checked if broken_links]
+    prompts = [link_prompt(checked[position][2], contexts[position]) for position in asking]
+    suggested = {}
+    for index, suggestions, error in iter_structured(prompts, LinkSuggestion, many=True, cancel_event=cancel_event):
+        suggested[asking[index]] = suggestions if suggestions is not None else [{"error": error}]
     result = []
 
-    for item in sdata:
-        try:
-            broken_links = check_broken_links([item], base_url=base_url)
-            context = retrieval(index, embeddings, texts, item["content"], top=3)
-            if broken_links:
-                suggestions = gen_prompt(broken_links, context)
-            else:
-                suggestions = []
-
+    for position, item, broken_links, error in checked:
+        if error is not None:
             result.append({
                 "id": item.get("id"),
-                "original_links": item.get("links", []),
-                "broken_links": broken_links,
-                "context_used": context,
-                "suggestions": suggestions
+                "error": str(error)
             })
+            continue
 
-        except Exception as e:
-            result.append({
-                "id": item.get("id"),
-                "error": str(e)
-            })
+        result.append({
+            "id": item.get("id"),
+            "original_links": item.get("links", []),
+            "broken_links": broken_links,
+            "context_used": contexts[position],
+            "suggestions": suggested.get(position, [])
+        })
 
     return result
-
-
-    return broken_links
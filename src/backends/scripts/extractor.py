@@ -0,0 +1,203 @@
+import os
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+TEXT_TAGS = {"p", "span"}
+# Text under these never shows up in BeautifulSoup's get_text().
+NON_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+    "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame",
+    "image", "isindex", "nextid", "spacer",
+}
+
+EXTRACTOR_BACKEND = os.getenv("EXTRACTOR_BACKEND", "lxml" if etree is not None else "html.parser")
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+
+class SectionBuilder:
+    """
+    Parser target that turns start/end/data events into scraper sections in one pass.
+
+    A heading starts a new section; the text and <a href> links of each p/span are
+    appended to the current one. Only the outermost matching element is captured,
+    so text nested in several matching elements is counted once.
+    """
+
+    def __init__(self):
+        self.sections = []
+        self.current = None
+        self.count = 0
+        self.stack = []
+        self.capture = None
+        self.suspended = None
+        self.anchors = []
+        self.skip_depth = None
+        self.text = []
+
+    def start(self, tag, attrs):
+        self.flush()
+        tag = tag.lower()
+        if tag in VOID_TAGS:
+            return
+        self.stack.append(tag)
+        depth = len(self.stack)
+
+        if tag in NON_TEXT_TAGS and self.skip_depth is None:
+            self.skip_depth = depth
+        if tag in HEADING_TAGS and (self.capture is None or self.capture["kind"] != "heading"):
+            if self.capture is not None:
+                # A heading inside a p/span: close the text so far, resume it after the heading.
+                self.suspended = self.capture["depth"]
+                self.finish_capture()
+            self.begin_capture("heading", depth)
+        elif tag in TEXT_TAGS and self.capture is None:
+            self.begin_capture("text", depth)
+        elif tag == "a" and self.capture is not None and "href" in attrs:
+            link = {"href": attrs["href"] or "", "content": ""}
+            self.capture["links"].append(link)
+            self.anchors.append((depth, link, []))
+
+    def end(self, tag):
+        self.flush()
+        tag = tag.lower()
+        if tag in VOID_TAGS or tag not in self.stack:
+            return
+        # Like BeautifulSoup, an end tag closes everything opened after its start tag.
+        while self.stack:
+            popped = self.stack.pop()
+            self.closed(len(self.stack) + 1)
+            if popped == tag:
+                break
+
+    def data(self, text):
+        if self.capture is not None and self.skip_depth is None:
+            self.text.append(text)
+
+    def comment(self, text):
+        self.flush()
+
+    def close(self):
+        self.flush()
+        if self.capture is not None:
+            self.finish_capture()
+        if self.current:
+            self.sections.append(self.current)
+        return self.sections
+
+    def flush(self):
+        if not self.text:
+            return
+        string = "".join(self.text).strip()
+        self.text = []
+        if not string or self.capture is None or self.skip_depth is not None:
+            return
+        self.capture["parts"].append(string)
+        for _, _, parts in self.anchors:
+            parts.append(string)
+
+    def closed(self, depth):
+        if self.skip_depth == depth:
+            self.skip_depth = None
+        while self.anchors and self.anchors[-1][0] >= depth:
+            self.finish_anchor()
+        if self.capture is not None and self.capture["depth"] == depth:
+            kind = self.capture["kind"]
+            self.finish_capture()
+            if kind == "heading" and self.suspended is not None and self.suspended < depth:
+                self.begin_capture("text", self.suspended, resumed=True)
+                self.suspended = None
+        if self.suspended == depth:
+            self.suspended = None
+
+    def begin_capture(self, kind, depth, resumed=False):
+        self.capture = {"kind": kind, "depth": depth, "parts": [], "links": [], "resumed": resumed}
+
+    def finish_anchor(self):
+        _, link, parts = self.anchors.pop()
+        link["content"] = "".join(parts)
+
+    def finish_capture(self):
+        while self.anchors:
+            self.finish_anchor()
+        capture, self.capture = self.capture, None
+        content = " ".join(capture["parts"])
+
+        if capture["kind"] == "heading":
+            if self.current:
+                self.sections.append(self.current)
+            self.count += 1
+            self.current = {"id": f"section_{self.count}", "content": content, "links": capture["links"]}
+            return
+
+        if capture["resumed"] and not capture["parts"] and not capture["links"]:
+            return
+        if self.current is None:
+            self.count += 1
+            self.current = {"id": f"section_{self.count}", "content": "", "links": []}
+        self.current["content"] += " " + content
+        self.current["links"].extend(capture["links"])
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def handle_comment(self, data):
+        self.target.comment(data)
+
+    def handle_decl(self, decl):
+        self.target.flush()
+
+    def handle_pi(self, data):
+        self.target.flush()
+
+
+def decode_html(html) -> str:
+    if isinstance(html, str):
+        return html
+    match = META_CHARSET.search(html[:4096])
+    encoding = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return html.decode(encoding, errors="replace")
+    except LookupError:
+        return html.decode("utf-8", errors="replace")
+
+
+def extract_sections(html, backend: str = None) -> list:
+    """
+    Split an HTML document into [{"id", "content", "links"}] sections in a single
+    streaming pass, without building a document tree. `html` may be str or bytes.
+    """
+    backend = backend or EXTRACTOR_BACKEND
+    builder = SectionBuilder()
+
+    if backend == "lxml" and etree is not None:
+        if not html:
+            return []
+        parser = etree.HTMLParser(target=builder)
+        # Decoded here: libxml2 reads bytes without a <meta charset> as Latin-1.
+        parser.feed(decode_html(html))
+        return parser.close()
+
+    parser = _StdlibParser(builder)
+    parser.feed(decode_html(html))
+    parser.close()
+    return builder.close()
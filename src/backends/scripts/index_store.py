@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+
+import faiss
+import numpy as np
+
+from scripts.ann_index import build_index, choose_index_type, index_type, trainable_type, tune_index
+from scripts.embedding_cache import text_digest
+from scripts.recrawl import section_hashes
+from scripts.url_utils import normalize_url, url_host
+
+INDEX_STORE_DIR = os.getenv(
+    "INDEX_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache_dir", "indexes"),
+)
+
+INDEX_FILE = "index.faiss"
+META_FILE = "meta.json"
+ENTRIES_DB = "entries.sqlite"
+# Bumped when the on-disk layout changes; an index written by another layout is rebuilt from scratch.
+STORE_LAYOUT = 2
+
+# Bigger types only: a site that shrinks keeps its index type instead of flapping at a threshold.
+INDEX_TYPE_RANK = {"flat": 0, "ivf": 1, "hnsw": 1, "ivfpq": 2}
+# IVF centroids trained on a small site go stale as it grows; retrain after this much growth.
+RETRAIN_GROWTH = 4
+SQL_BATCH = 500
+
+
+def content_id(text: str) -> int:
+    """
+    64-bit id of a text (whitespace-normalised), the same on every page and scrape:
+    boilerplate repeated across the site is stored under one id.
+    """
+    return int.from_bytes(text_digest(text)[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def page_version(hashes: dict) -> str:
+    return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SiteIndex:
+    """
+    Persistent vector index for every scraped page of one website.
+
+    Texts are stored in an IndexIDMap2 under ids derived from their content, so a
+    re-scraped page only adds the texts it didn't have, and navigation, footers and
+    the like shared by many pages are embedded and stored once. Each page references
+    the entries it contains; an entry is removed when no page references it any more.
+    Each page records the version (hash of its section hashes) it was indexed at; a
+    request for an unchanged page does no encoding and no index work at all.
+
+    Entry texts, references and page versions live in SQLite next to the index, so
+    syncing a page writes that page's rows only. meta.json holds just the model,
+    layout and training size.
+    """
+
+    def __init__(self, site: str, directory: str):
+        self.site = site
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.index = None
+        self.mmapped = False
+        self.meta = {"model": None, "layout": STORE_LAYOUT}
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _connect(self):
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self._path(ENTRIES_DB), timeout=30)
+        # An entry's page and section are those of the page that first stored its text.
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY, page TEXT NOT NULL, section TEXT NOT NULL, text TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS refs (page TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (page, id))")
+        conn.execute("CREATE INDEX IF NOT EXISTS refs_id ON refs (id)")
+        conn.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, version TEXT NOT NULL)")
+        return conn
+
+    def _load(self):
+        if not os.path.exists(self._path(META_FILE)):
+            return
+        with open(self._path(META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("layout") != STORE_LAYOUT:
+            # Written by an older layout (per-page ids, or every text in meta.json): start over.
+            self._reset(meta.get("model"))
+            return
+        self.meta = meta
+        if os.path.exists(self._path(INDEX_FILE)):
+            self._load_index()
+
+    def _load_index(self, writable=False):
+        self.mmapped = False
+        if not writable and hasattr(faiss, "IO_FLAG_MMAP"):
+            try:
+                self.index = tune_index(faiss.read_index(self._path(INDEX_FILE), faiss.IO_FLAG_MMAP))
+                self.mmapped = True
+                return
+            except RuntimeError:
+                pass  # this index type or faiss build can't be memory-mapped
+        self.index = tune_index(faiss.read_index(self._path(INDEX_FILE)))
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_index = self._path(INDEX_FILE + ".tmp")
+        faiss.write_index(self.index, tmp_index)
+        os.replace(tmp_index, self._path(INDEX_FILE))
+        tmp_meta = self._path(META_FILE + ".tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_meta, self._path(META_FILE))
+
+    def _reset(self, model_name):
+        self.index = None
+        self.mmapped = False
+        self.meta = {"model": model_name, "layout": STORE_LAYOUT}
+        # The entries database goes too, as its tables may be of an older layout.
+        for name in (INDEX_FILE, META_FILE, ENTRIES_DB, ENTRIES_DB + "-journal"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+
+    @staticmethod
+    def _select(conn, query, ids):
+        """Rows of `query` (which ends in "IN ({})") for `ids`, in batches."""
+        ids = list(ids)
+        rows = []
+        for start in range(0, len(ids), SQL_BATCH):
+            chunk = ids[start:start + SQL_BATCH]
+            rows += conn.execute(query.format(",".join("?" * len(chunk))), chunk).fetchall()
+        return rows
+
+    def sync_page(self, page_url: str, sdata: list, model_name: str, encode) -> list:
+        """
+        Bring one page's items (sections or chunks with a "section_id") in the index up
+        to date, encoding only texts the site doesn't have yet with `encode(texts)`.
+        Returns the page's ids in item order; items with the same text share an id.
+        """
+        page_url = normalize_url(page_url) or page_url
+        version = page_version(section_hashes(sdata))
+        ids = [content_id(item["content"]) for item in sdata]
+
+        with self.lock:
+            if self.meta.get("model") != model_name:
+                self._reset(model_name)
+            conn = self._connect()
+            try:
+                page = conn.execute("SELECT version FROM pages WHERE url = ?", (page_url,)).fetchone()
+                if page and page[0] == version and (self.index is not None or not ids):
+                    return ids
+
+                if self.mmapped:
+                    # Only the index is re-read; page and entry state live in SQLite.
+                    self._load_index(writable=True)
+                desired = dict(zip(ids, sdata))
+                old = {row[0] for row in conn.execute("SELECT id FROM refs WHERE page = ?", (page_url,))}
+                dropped = old - desired.keys()
+                conn.executemany("DELETE FROM refs WHERE page = ? AND id = ?", [(page_url, i) for i in dropped])
+                conn.executemany("INSERT OR IGNORE INTO refs (page, id) VALUES (?, ?)", [(page_url, i) for i in desired.keys() - old])
+                # Texts other pages still contain stay in the index.
+                referenced = {row[0] for row in self._select(conn, "SELECT DISTINCT id FROM refs WHERE id IN ({})", dropped)}
+                orphaned = dropped - referenced
+                stored = {row[0] for row in self._select(conn, "SELECT id FROM entries WHERE id IN ({})", desired)}
+                to_add = [i for i in desired if i not in stored]
+
+                # New ids are removed too, in case an interrupted sync left their vectors behind.
+                removed = orphaned | set(to_add)
+                if removed and self.index is not None:
+                    self.index.remove_ids(np.array(sorted(removed), dtype="int64"))
+                conn.executemany("DELETE FROM entries WHERE id = ?", [(i,) for i in orphaned])
+                if to_add:
+                    texts = [desired[i]["content"] for i in to_add]
+                    vectors = np.ascontiguousarray(encode(texts), dtype="float32")
+                    if self.index is None:
+                        self.index = build_index(vectors, kind="flat", ids=to_add)
+                        self.meta["trained_on"] = len(to_add)
+                    else:
+                        self.index.add_with_ids(vectors, np.array(to_add, dtype="int64"))
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO entries (id, page, section, text) VALUES (?, ?, ?, ?)",
+                        [(i, page_url, desired[i].get("section_id", desired[i]["id"]), desired[i]["content"]) for i in to_add],
+                    )
+                conn.execute("INSERT OR REPLACE INTO pages (url, version) VALUES (?, ?)", (page_url, version))
+
+                if self.index is not None:
+                    self._maybe_rebuild(conn, encode)
+                    self._save()
+                # Committed after the index is on disk: a crash in between only makes the page look changed.
+                conn.commit()
+                return ids
+            finally:
+                conn.close()
+
+    def _maybe_rebuild(self, conn, encode):
+        """Move to a larger index type as the site grows, and retrain IVF centroids after heavy growth."""
+        n = self.index.ntotal
+        current = index_type(self.index)
+        # Compared with what build_index would really build: below the training minimum a
+        # forced IVF type is still flat, and rebuilding would only re-encode the whole site.
+        wanted = trainable_type(choose_index_type(n, removable=True), n)
+        outgrown = current != "flat" and n > RETRAIN_GROWTH * self.meta.get("trained_on", n)
+        if INDEX_TYPE_RANK[wanted] <= INDEX_TYPE_RANK[current] and not outgrown:
+            return
+
+        rows = conn.execute("SELECT id, text FROM entries").fetchall()
+        # Vectors come back from the embedding cache, so a rebuild re-encodes almost nothing.
+        vectors = encode([text for _, text in rows])
+        kind = wanted if INDEX_TYPE_RANK[wanted] > INDEX_TYPE_RANK[current] else current
+        self.index = build_index(vectors, kind=kind, ids=[i for i, _ in rows], removable=True)
+        self.meta["trained_on"] = n
+
+    def neighbours(self, ids: list, encode, k: int) -> list:
+        """
+        Nearest stored items anywhere on the site for each id, excluding the id itself
+        (and so any copy of the same text on other pages), as lists of
+        (distance, id, (page, section_id), text).
+        """
+        with self.lock:
+            if self.index is None or self.index.ntotal == 0 or not ids:
+                return [[] for _ in ids]
+            conn = self._connect()
+            try:
+                query = "SELECT id, page, section, text FROM entries WHERE id IN ({})"
+                entries = {row[0]: row[1:] for row in self._select(conn, query, set(ids))}
+                known = [i for i in ids if i in entries]
+                if not known:
+                    return [[] for _ in ids]
+                # Compressed and IVF indexes can't reconstruct stored vectors, so queries are
+                # re-read through `encode`, which is served from the embedding cache.
+                queries = np.ascontiguousarray(encode([entries[i][2] for i in known]), dtype="float32")
+                distances, neighbours = self.index.search(queries, min(k + 1, self.index.ntotal))
+                found = {int(n) for n in neighbours.ravel() if n >= 0} - entries.keys()
+                entries.update({row[0]: row[1:] for row in self._select(conn, query, found)})
+            finally:
+                conn.close()
+
+        hits_by_id = {}
+        for own, drow, nrow in zip(known, distances, neighbours):
+            hits = []
+            for distance, n in zip(drow, nrow):
+                entry = entries.get(int(n))
+                if n < 0 or n == own or entry is None:
+                    continue
+                page, section, text = entry
+                hits.append((float(distance), int(n), (page, section), text))
+            hits_by_id[own] = hits[:k]
+        return [hits_by_id.get(i, []) for i in ids]
+
+    def drop(self):
+        with self.lock:
+            self._reset(self.meta.get("model"))
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_site_indexes = {}
+_site_indexes_lock = threading.Lock()
+
+
+def site_key(url: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", url_host(normalize_url(url) or url)) or "_"
+
+
+def get_site_index(url: str) -> SiteIndex:
+    """The persistent index for the website `url` belongs to, loaded once per process."""
+    key = site_key(url)
+    with _site_indexes_lock:
+        if key not in _site_indexes:
+            _site_indexes[key] = SiteIndex(key, os.path.join(INDEX_STORE_DIR, key))
+        return _site_indexes[key]
+
+
+def drop_site_index(url: str) -> None:
+    get_site_index(url).drop()
@@ -0,0 +1,166 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, zip_longest
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scripts.http_utils import USER_AGENT, HostLimiter
+from scripts.url_utils import normalize_url, url_host
+
+LINK_CHECK_CONCURRENCY = int(os.getenv("LINK_CHECK_CONCURRENCY", "32"))
+LINK_CHECK_PER_HOST = int(os.getenv("LINK_CHECK_PER_HOST", "8"))
+LINK_CHECK_TIMEOUT = float(os.getenv("LINK_CHECK_TIMEOUT", "10"))
+
+# 416 means the ranged GET asked past the end of an empty body: the resource exists.
+OK_STATUSES = {416}
+# Rate limited or temporarily down: the link's state is unknown, so it is neither reported nor stored.
+RETRY_LATER_STATUSES = {429, 503}
+
+link_session = requests.Session()
+link_session.headers.update({"User-Agent": USER_AGENT, "Accept": "*/*"})
+link_session.mount("http://", HTTPAdapter(pool_connections=100, pool_maxsize=LINK_CHECK_CONCURRENCY))
+link_session.mount("https://", HTTPAdapter(pool_connections=100, pool_maxsize=LINK_CHECK_CONCURRENCY))
+
+
+def is_ok(status) -> bool:
+    return status is not None and (status < 400 or status in OK_STATUSES)
+
+
+def is_dns_failure(error: Exception) -> bool:
+    text = str(error)
+    return isinstance(error, requests.ConnectionError) and (
+        "NameResolutionError" in text or "Name or service not known" in text or "getaddrinfo failed" in text
+        or "nodename nor servname" in text or "Failed to resolve" in text
+    )
+
+
+def check_url(url: str, timeout: float = LINK_CHECK_TIMEOUT) -> dict:
+    """
+    Status of one URL: HEAD first, then a one-byte ranged GET when the server
+    rejects or mishandles HEAD (405, 403, 404 from some CDNs...). Redirects are followed.
+    A 429 or 503 marks the result `retry_later` instead of broken.
+    """
+    result = {"url": url, "status": None, "ok": False, "final_url": None, "method": "HEAD", "error": None,
+              "dns_failure": False, "retry_later": False}
+    try:
+        response = link_session.head(url, allow_redirects=True, timeout=timeout)
+        if not is_ok(response.status_code) and response.status_code not in RETRY_LATER_STATUSES:
+            result["method"] = "GET"
+            response = link_session.get(url, headers={"Range": "bytes=0-0"}, stream=True, allow_redirects=True, timeout=timeout)
+            response.close()
+        status = response.status_code
+        result.update(status=status, ok=is_ok(status), final_url=response.url, retry_later=status in RETRY_LATER_STATUSES)
+    except requests.RequestException as e:
+        result.update(error=str(e), dns_failure=is_dns_failure(e))
+    return result
+
+
+def dns_failure_result(url: str) -> dict:
+    """Result for a URL whose host is already known not to resolve."""
+    return {
+        "url": url,
+        "status": None,
+        "ok": False,
+        "final_url": None,
+        "method": None,
+        "error": f"DNS lookup for {url_host(url)} failed",
+        "dns_failure": True,
+        "retry_later": False,
+    }
+
+
+def throttled_result(url: str) -> dict:
+    """Result for a URL on a host that has just answered 429 Too Many Requests."""
+    return {
+        "url": url,
+        "status": 429,
+        "ok": False,
+        "final_url": None,
+        "method": None,
+        "error": f"{url_host(url)} is rate limiting link checks",
+        "dns_failure": False,
+        "retry_later": True,
+    }
+
+
+def interleave_by_host(urls) -> list:
+    """Round-robin URLs across hosts so workers aren't all parked on one host's cap."""
+    by_host = defaultdict(list)
+    for url in urls:
+        by_host[url_host(url)].append(url)
+    return [url for url in chain.from_iterable(zip_longest(*by_host.values())) if url is not None]
+
+
+def check_urls(urls, concurrency: int = LINK_CHECK_CONCURRENCY, per_host: int = LINK_CHECK_PER_HOST) -> dict:
+    """{url: result} for the unique URLs, checked concurrently over pooled keep-alive connections."""
+    unique = interleave_by_host(dict.fromkeys(urls))
+    if not unique:
+        return {}
+    limiter = HostLimiter(per_host, 0)
+    # Once a host fails to resolve, its other URLs are failed without a lookup each;
+    # once it rate limits us, its other URLs are left unchecked rather than hammering it.
+    unresolved = set()
+    throttled = set()
+
+    def check(url):
+        host = url_host(url)
+        limiter.acquire(host)
+        try:
+            if host in unresolved:
+                return dns_failure_result(url)
+            if host in throttled:
+                return throttled_result(url)
+            result = check_url(url)
+            if result["dns_failure"]:
+                unresolved.add(host)
+            if result["status"] == 429:
+                throttled.add(host)
+            return result
+        finally:
+            limiter.release(host)
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(unique))) as pool:
+        return dict(zip(unique, pool.map(check, unique)))
+
+
+def page_links(sections: list, base_url: str = None) -> list:
+    """Per section, its [(link, normalized_url)] for http(s) links; mailto:, tel: and the like are skipped."""
+    found = []
+    for section in sections:
+        links = []
+        if isinstance(section, dict):
+            for link in section.get("links", []):
+                if not isinstance(link, dict) or not link.get("href"):
+                    continue
+                url = normalize_url(link["href"], base_url)
+                if url:
+                    links.append((link, url))
+        found.append(links)
+    return found
+
+
+def find_broken_links(sections: list, base_url: str = None, check=check_urls) -> list:
+    """
+    Broken links of every section, in section order. Each distinct URL on the page
+    is checked once, however many sections link to it. Links that could not be
+    checked for now (rate limited, 503) are not reported.
+    """
+    links = page_links(sections, base_url)
+    results = check(url for section_links in links for _, url in section_links)
+    broken = []
+    for section_links in links:
+        section_broken = []
+        for link, url in section_links:
+            result = results[url]
+            if not result["ok"] and not result.get("retry_later"):
+                section_broken.append({
+                    "href": link["href"],
+                    "content": link.get("content", ""),
+                    "url": url,
+                    "status": result["status"],
+                    "error": result["error"],
+                })
+        broken.append(section_broken)
+    return broken
@@ -0,0 +1,101 @@
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from database.conn import db
+from scripts.link_checker import check_urls, dns_failure_result
+from scripts.url_utils import url_host
+
+logger = logging.getLogger(__name__)
+
+link_status_collection = db["link_status"]
+dns_failures_collection = db["link_dns_failures"]
+
+LINK_STATUS_CACHE_ENABLED = os.getenv("LINK_STATUS_CACHE", "1") == "1"
+# Seconds a result is trusted before the URL is probed again.
+LINK_OK_TTL = int(os.getenv("LINK_OK_TTL", str(7 * 24 * 3600)))
+LINK_BROKEN_TTL = int(os.getenv("LINK_BROKEN_TTL", str(6 * 3600)))
+LINK_DNS_TTL = int(os.getenv("LINK_DNS_TTL", str(3600)))
+
+RESULT_FIELDS = ("status", "ok", "final_url", "method", "error", "dns_failure", "checked_at")
+
+
+def result_ttl(result: dict) -> int:
+    if result["ok"]:
+        return LINK_OK_TTL
+    return LINK_DNS_TTL if result.get("dns_failure") else LINK_BROKEN_TTL
+
+
+def load_statuses(urls: list, now: datetime) -> dict:
+    """Unexpired stored results for these URLs, as {url: result}."""
+    try:
+        docs = link_status_collection.find({"_id": {"$in": urls}, "expires_at": {"$gt": now}})
+        return {doc["_id"]: {"url": doc["_id"], **{field: doc.get(field) for field in RESULT_FIELDS}} for doc in docs}
+    except PyMongoError as e:
+        logger.warning("Link status store unavailable, checking every link: %s", e)
+        return {}
+
+
+def load_dns_failures(hosts: list, now: datetime) -> set:
+    """Hosts whose name failed to resolve within LINK_DNS_TTL."""
+    if not hosts:
+        return set()
+    try:
+        return {doc["_id"] for doc in dns_failures_collection.find({"_id": {"$in": hosts}, "expires_at": {"$gt": now}}, {"_id": 1})}
+    except PyMongoError as e:
+        logger.warning("DNS failure cache unavailable: %s", e)
+        return set()
+
+
+def save_statuses(results: dict, now: datetime) -> None:
+    """Persist fresh {url: result} checks, and the hosts that failed DNS resolution."""
+    operations = []
+    for url, result in results.items():
+        if result.get("retry_later"):
+            continue  # rate limited or unavailable: probe again next time
+        result["checked_at"] = now
+        fields = {field: result.get(field) for field in RESULT_FIELDS}
+        fields["expires_at"] = now + timedelta(seconds=result_ttl(result))
+        operations.append(UpdateOne({"_id": url}, {"$set": fields}, upsert=True))
+    dns_operations = [
+        UpdateOne(
+            {"_id": host},
+            {"$set": {"checked_at": now, "expires_at": now + timedelta(seconds=LINK_DNS_TTL)}},
+            upsert=True,
+        )
+        for host in {url_host(url) for url, result in results.items() if result.get("dns_failure")}
+    ]
+    try:
+        if operations:
+            link_status_collection.bulk_write(operations, ordered=False)
+        if dns_operations:
+            dns_failures_collection.bulk_write(dns_operations, ordered=False)
+    except PyMongoError as e:
+        logger.warning("Could not store link statuses: %s", e)
+
+
+def cached_check_urls(urls, check=check_urls) -> dict:
+    """
+    Like check_urls, but URLs checked recently (by any audit, of any page) are
+    answered from the store, as are URLs on hosts that recently failed DNS
+    resolution. Only missing or expired entries are probed again.
+    """
+    urls = list(dict.fromkeys(urls))
+    if not LINK_STATUS_CACHE_ENABLED or not urls:
+        return check(urls)
+
+    now = datetime.now(timezone.utc)
+    results = load_statuses(urls, now)
+    failed_hosts = load_dns_failures(list({url_host(url) for url in urls if url not in results}), now)
+    for url in urls:
+        if url not in results and url_host(url) in failed_hosts:
+            results[url] = dns_failure_result(url)
+
+    stale = [url for url in urls if url not in results]
+    if stale:
+        fresh = check(stale)
+        save_statuses(fresh, now)
+        results.update(fresh)
+    logger.info("Link check: %d of %d URLs served from the status store", len(urls) - len(stale), len(urls))
+    return results
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+from scripts.chunking import count_tokens
+
+load_dotenv()
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+logger = logging.getLogger(__name__)
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1") == "1"
+LLM_CACHE_DIR = os.getenv(
+    "LLM_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache_dir", "llm"),
+)
+# Seconds a response stays valid; 0 keeps it until evicted.
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_SIZE_MB = int(os.getenv("LLM_CACHE_SIZE_MB", "256"))
+# Per-call usage records kept in memory for reporting.
+LLM_USAGE_RECENT = int(os.getenv("LLM_USAGE_RECENT", "200"))
+
+
+def response_key(model: str, prompt, generation_config: dict = None) -> str:
+    """Cache key of one call: model, prompt hash and generation parameters."""
+    payload = json.dumps({"model": model, "prompt": prompt, "config": generation_config or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache on diskcache: entries expire after `ttl` seconds
+    and the least recently used ones are evicted beyond `size_mb`. Shared by every
+    worker process using the same directory.
+    """
+
+    def __init__(self, directory=LLM_CACHE_DIR, ttl=LLM_CACHE_TTL, size_mb=LLM_CACHE_SIZE_MB):
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._cache = diskcache.Cache(
+            directory,
+            size_limit=size_mb * 2**20,
+            eviction_policy="least-recently-used",
+        )
+
+    def get(self, key):
+        text = self._cache.get(key)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def peek(self, key):
+        """Like get, without counting a hit or miss."""
+        return self._cache.get(key)
+
+    def set(self, key, text):
+        self._cache.set(key, text, expire=self.ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._cache),
+            "size_bytes": self._cache.volume(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """The process-wide response cache, or None when disabled or diskcache is missing."""
+    global _cache
+    if not LLM_CACHE_ENABLED or diskcache is None:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def cached_response(prompt, model: str = LLM_MODEL, generation_config: dict = None):
+    """The cached response text for this call, or None. Not counted in the hit/miss stats."""
+    cache = get_response_cache()
+    return cache.peek(response_key(model, prompt, generation_config)) if cache else None
+
+
+class UsageRecorder:
+    """Prompt and completion tokens and latency of every LLM call, totalled per process."""
+
+    def __init__(self, recent=LLM_USAGE_RECENT):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+        self.recent = deque(maxlen=recent)
+
+    def record(self, model, prompt_tokens, completion_tokens, seconds, cached=False, estimated=False):
+        entry = {
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "seconds": round(seconds, 3),
+            "cached": cached,
+            "estimated": estimated,
+            "at": time.time(),
+        }
+        with self._lock:
+            self.recent.append(entry)
+            if cached:
+                self.cached_calls += 1
+                return
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.seconds += seconds
+        logger.info("LLM call %s: %d prompt + %d completion tokens in %.2fs", model, prompt_tokens, completion_tokens, seconds)
+
+    def stats(self, recent: bool = False) -> dict:
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "cached_calls": self.cached_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "avg_seconds": round(self.seconds / self.calls, 3) if self.calls else None,
+            }
+            if recent:
+                stats["recent"] = list(self.recent)
+        return stats
+
+
+usage = UsageRecorder()
+
+
+def response_tokens(response, prompt, text):
+    """(prompt_tokens, completion_tokens, estimated): the API's counts when it reports them, else local estimates."""
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is not None and getattr(metadata, "prompt_token_count", None):
+        return metadata.prompt_token_count, getattr(metadata, "candidates_token_count", 0) or 0, False
+    prompt_text = prompt if isinstance(prompt, str) else " ".join(map(str, prompt))
+    return count_tokens(prompt_text), count_tokens(text), True
+
+
+def generate(prompt, model: str = LLM_MODEL, generation_config: dict = None, use_cache: bool = True) -> str:
+    """
+    Text of the model's response to `prompt`, served from the response cache when the
+    same model, prompt and generation parameters were answered before. API errors
+    propagate to the caller and are never cached.
+    """
+    cache = get_response_cache() if use_cache else None
+    key = response_key(model, prompt, generation_config) if cache else None
+    started = time.perf_counter()
+    if cache:
+        text = cache.get(key)
+        if text is not None:
+            usage.record(model, 0, 0, time.perf_counter() - started, cached=True)
+            return text
+
+    response = genai.GenerativeModel(model).generate_content(prompt, generation_config=generation_config)
+    text = response.text.strip()
+    prompt_tokens, completion_tokens, estimated = response_tokens(response, prompt, text)
+    usage.record(model, prompt_tokens, completion_tokens, time.perf_counter() - started, estimated=estimated)
+    if cache and text:
+        cache.set(key, text)
+    return text
+
+
+def cache_stats() -> dict:
+    cache = get_response_cache()
+    return cache.stats() if cache else {"enabled": False}
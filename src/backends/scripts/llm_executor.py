@@ -0,0 +1,176 @@
+import asyncio
+import atexit
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ThreadPoolExecutor, wait
+
+from scripts.chunking import count_tokens
+from scripts.llm import cached_response, generate
+
+logger = logging.getLogger(__name__)
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+# Provider quotas; keep them at or under the API key's limits.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_RPM", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TPM", "1000000"))
+# Output tokens charged against the TPM bucket up front, on top of the prompt.
+LLM_OUTPUT_TOKENS = int(os.getenv("LLM_OUTPUT_TOKENS", "1024"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+CANCEL_POLL_SECONDS = 0.2
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection errors, rate limiting (429) and server errors (5xx)."""
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    # google.api_core exceptions carry the HTTP status as `code`.
+    try:
+        return int(getattr(error, "code", None)) in RETRYABLE_STATUS
+    except (TypeError, ValueError):
+        return False
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+class TokenBucket:
+    """Allows `per_minute` units per minute, with bursts up to one minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: int = 1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class LLMExecutor:
+    """
+    Runs LLM calls concurrently on an asyncio loop in a background thread.
+
+    At most `concurrency` calls are in flight, requests and prompt tokens are
+    metered by per-minute token buckets, and calls that time out or fail with
+    429/5xx are retried with jittered exponential backoff. Cached responses skip
+    the limits entirely. Callers stay synchronous: `as_completed` yields each
+    result as soon as it arrives.
+    """
+
+    def __init__(self, concurrency=LLM_CONCURRENCY, rpm=LLM_REQUESTS_PER_MINUTE, tpm=LLM_TOKENS_PER_MINUTE,
+                 timeout=LLM_TIMEOUT, retries=LLM_MAX_RETRIES):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.calls = 0
+        self.retried = 0
+        self.failed = 0
+        # Timed-out calls can't be interrupted and keep their thread, so leave headroom.
+        self._threads = ThreadPoolExecutor(self.concurrency * 2, thread_name_prefix="llm")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-executor", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(rpm, tpm), self._loop).result()
+
+    async def _setup(self, rpm, tpm):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+
+    async def _call(self, prompt, kwargs):
+        run = functools.partial(generate, prompt, **kwargs)
+        if cached_response(prompt, **kwargs) is not None:
+            return await self._loop.run_in_executor(self._threads, run)
+
+        tokens = count_tokens(prompt if isinstance(prompt, str) else str(prompt)) + LLM_OUTPUT_TOKENS
+        for attempt in range(self.retries + 1):
+            async with self._semaphore:
+                await self._requests.acquire()
+                await self._tokens.acquire(tokens)
+                self.calls += 1
+                try:
+                    return await asyncio.wait_for(self._loop.run_in_executor(self._threads, run), self.timeout)
+                except Exception as e:
+                    if attempt == self.retries or not is_retryable(e):
+                        self.failed += 1
+                        raise
+                    logger.info("LLM call failed (%s), retry %d of %d", e or type(e).__name__, attempt + 1, self.retries)
+                    self.retried += 1
+            await asyncio.sleep(backoff_delay(attempt))
+
+    def as_completed(self, prompts: list, cancel_event: threading.Event = None, **kwargs):
+        """
+        Run `generate(prompt, **kwargs)` for every prompt, yielding (index, text) in
+        completion order, with the exception in place of the text for a call that
+        finally failed. Setting `cancel_event` (e.g. when the client disconnects), or
+        closing the generator, cancels the calls not yet finished; the former raises
+        CancelledError.
+        """
+        futures = {asyncio.run_coroutine_threadsafe(self._call(prompt, kwargs), self._loop): i for i, prompt in enumerate(prompts)}
+        pending = set(futures)
+        try:
+            while pending:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise CancelledError()
+                done, pending = wait(pending, CANCEL_POLL_SECONDS if cancel_event is not None else None, FIRST_COMPLETED)
+                for future in done:
+                    error = future.exception()
+                    yield futures[future], error if error is not None else future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "calls": self.calls,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._threads.shutdown(wait=False)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_llm_executor() -> LLMExecutor:
+    """Return the process-wide LLM executor, starting it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = LLMExecutor()
+            atexit.register(_executor.close)
+        return _executor
+
+
+def generate_as_completed(prompts: list, cancel_event: threading.Event = None, **kwargs):
+    """Concurrent, rate-limited `generate` over `prompts`; see LLMExecutor.as_completed."""
+    if not prompts:
+        return iter(())
+    return get_llm_executor().as_completed(prompts, cancel_event, **kwargs)
@@ -1,18 +1,120 @@
-import faiss
+import os
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from scripts.embedding_model import get_embedding_model
+from scripts.embedding_cache import get_embedding_cache, text_digest
+from scripts.index_store import get_site_index
+from scripts.ann_index import build_index
+from scripts.chunking import chunk_sections, dedupe_chunks, fit_to_budget
+from scripts.url_utils import normalize_url
 
-embedding_model = SentenceTransformer('all-MiniLM-l6-v2')
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") == "1"
+SITE_INDEX_ENABLED = os.getenv("SITE_INDEX", "1") == "1"
+RAG_CHUNKING_ENABLED = os.getenv("RAG_CHUNKING", "1") == "1"
+# Context tokens per section prompt (0 = unlimited), and the squared L2 distance
+# beyond which a neighbour is too unrelated to include (0 = no threshold). With
+# normalised embeddings 1.4 is a cosine similarity of about 0.3.
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "400"))
+RAG_MAX_DISTANCE = float(os.getenv("RAG_MAX_DISTANCE", "1.4"))
+
+def encode_texts(texts):
+    """Embeddings for `texts`, encoding only those missing from the on-disk cache."""
+    embedding_model = get_embedding_model()
+    if not EMBEDDING_CACHE_ENABLED:
+        return embedding_model.encode(texts)
+
+    dim = embedding_model.dimension()
+    cache = get_embedding_cache(embedding_model.cache_key, dim)
+    embeddings = np.zeros((len(texts), dim), dtype="float32")
+    found, missing = cache.get_many(texts)
+    for position, vector in found.items():
+        embeddings[position] = vector
+    if missing:
+        missing_texts = [texts[position] for position in missing]
+        encoded = embedding_model.encode(missing_texts)
+        embeddings[missing] = encoded
+        cache.put_many(missing_texts, encoded)
+    return embeddings
 
 def vec_store(sdata):
     texts = [item["content"] for item in sdata]
-    embeddings = embedding_model.encode(texts, convert_to_numpy=True)
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings)
+    embeddings = encode_texts(texts)
+    index = build_index(embeddings)
     return index, embeddings, texts
 
-def retrieval(index, embeddings, texts, query_text, top=3):
-    query_embedding = embedding_model.encode([query_text])
-    distances, indices = index.search(query_embedding, top)
-    retrieved = [texts[idx] for idx in indices[0]]
-    return "\n\n".join(retrieved)
+def prepare_chunks(sdata):
+    """
+    Chunks to embed for a page: token-bounded pieces of each section with exact and
+    near duplicates (nav, footers, cookie banners) dropped. Returns
+    (all_chunks, kept_chunks, duplicate_of).
+    """
+    if not RAG_CHUNKING_ENABLED:
+        chunks = [{"id": item["id"], "section_id": item["id"], "content": item["content"]} for item in sdata]
+        return chunks, chunks, {}
+    chunks = chunk_sections(sdata)
+    kept, duplicate_of = dedupe_chunks(chunks)
+    return chunks, kept, duplicate_of
+
+def chunk_neighbours(chunks, k):
+    """Nearest chunks of the same page for every chunk, as (distance, chunk_id, (None, section_id), text)."""
+    if not chunks:
+        return []
+    index, embeddings, texts = vec_store(chunks)
+    distances, indices = index.search(np.ascontiguousarray(embeddings, dtype="float32"), min(k + 1, len(chunks)))
+    return [
+        [(float(d), chunks[i]["id"], (None, chunks[i]["section_id"]), texts[i]) for d, i in zip(drow, irow) if i >= 0]
+        for drow, irow in zip(distances, indices)
+    ]
+
+def section_contexts(sdata, top=3, url=None):
+    """
+    Retrieved context for every section. Sections are chunked and deduplicated before
+    embedding, and retrieved chunks are mapped back to their sections: a section never
+    gets its own text back, from its page or any other, and each context holds
+    distinct chunk texts (compared whitespace-normalised, as the site index stores
+    them). Neighbours beyond RAG_MAX_DISTANCE are left out and each context is cut
+    to RAG_CONTEXT_TOKENS, nearest first.
+
+    When the page `url` is known, neighbours come from the persistent index of its
+    whole site, which is only updated for changed chunks.
+    """
+    chunks, kept, duplicate_of = prepare_chunks(sdata)
+    # Each chunk also needs room for its own section's other chunks, which are filtered out.
+    k = 3 * top
+    if url and SITE_INDEX_ENABLED:
+        page = normalize_url(url) or url
+        site_index = get_site_index(url)
+        ids = site_index.sync_page(url, kept, get_embedding_model().cache_key, encode_texts)
+        query_keys = {chunk["id"]: key for chunk, key in zip(kept, ids)}
+        neighbours = site_index.neighbours(ids, encode_texts, k)
+    else:
+        page = None
+        query_keys = {chunk["id"]: chunk["id"] for chunk in kept}
+        neighbours = chunk_neighbours(kept, k)
+
+    hits_by_chunk = {chunk["id"]: hits for chunk, hits in zip(kept, neighbours)}
+    chunks_by_section = {}
+    digests_by_section = {}
+    for chunk in chunks:
+        chunks_by_section.setdefault(chunk["section_id"], []).append(duplicate_of.get(chunk["id"], chunk["id"]))
+        digests_by_section.setdefault(chunk["section_id"], set()).add(text_digest(chunk["content"]))
+
+    contexts = []
+    for item in sdata:
+        own_section = (page, item["id"])
+        representatives = chunks_by_section.get(item["id"], [])
+        own_keys = {query_keys.get(chunk_id) for chunk_id in representatives}
+        hits = sorted(hit for chunk_id in representatives for hit in hits_by_chunk.get(chunk_id, []))
+        # The section's own texts, wherever else on the site they appear, are never its context.
+        retrieved, seen = [], set(digests_by_section.get(item["id"], ()))
+        for distance, key, section, text in hits:
+            if RAG_MAX_DISTANCE and distance > RAG_MAX_DISTANCE:
+                break
+            digest = text_digest(text)
+            if section == own_section or key in own_keys or digest in seen:
+                continue
+            seen.add(digest)
+            retrieved.append(text)
+            if len(retrieved) == top:
+                break
+        contexts.append(fit_to_budget(retrieved, RAG_CONTEXT_TOKENS))
+    return contexts
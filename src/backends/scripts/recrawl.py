@@ -0,0 +1,32 @@
+import hashlib
+import json
+
+def section_hash(section: dict) -> str:
+    """Stable hash of a section's text and links, used to detect changed sections."""
+    payload = json.dumps(
+        {"content": section.get("content", ""), "links": section.get("links", [])},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def section_hashes(sections: list) -> dict:
+    return {section["id"]: section_hash(section) for section in sections}
+
+def diff_sections(old_hashes: dict, new_hashes: dict) -> dict:
+    """Which section ids were added, removed or modified between two scrapes."""
+    old_hashes = old_hashes or {}
+    added = [sid for sid in new_hashes if sid not in old_hashes]
+    removed = [sid for sid in old_hashes if sid not in new_hashes]
+    modified = [sid for sid, h in new_hashes.items() if sid in old_hashes and old_hashes[sid] != h]
+    return {
+        "changed": bool(added or removed or modified),
+        "added": added,
+        "removed": removed,
+        "modified": modified,
+        "unchanged": len(new_hashes) - len(added) - len(modified),
+    }
+
+def no_changes(sections: list) -> dict:
+    """Change report for a page the server answered with 304 Not Modified."""
+    return {"changed": False, "added": [], "removed": [], "modified": [], "unchanged": len(sections)}
@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import PyMongoError
+from database.conn import db
+from scripts.recrawl import section_hashes, diff_sections, no_changes
+from scripts.scraper import scrape_page
+from scripts.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+websites_collection = db["websites"]
+
+# Seconds a scrape is served without re-checking the page.
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", "3600"))
+# Hot pages kept in this process in front of Mongo.
+SCRAPE_CACHE_MEMORY_ITEMS = int(os.getenv("SCRAPE_CACHE_MEMORY_ITEMS", "64"))
+
+
+def as_utc(moment: datetime) -> datetime:
+    """PyMongo hands back naive datetimes that are in UTC."""
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def is_cache_valid(scraped_at, ttl: int = SCRAPE_CACHE_TTL) -> bool:
+    if not isinstance(scraped_at, datetime):
+        return False
+    return datetime.now(timezone.utc) - as_utc(scraped_at) < timedelta(seconds=ttl)
+
+
+class ScrapeCache:
+    """
+    Scraped sections per URL: an in-process LRU for hot pages in front of the
+    shared `websites` collection. Expired pages are re-checked with a conditional
+    request when validators are stored, so an unchanged page isn't rendered again.
+
+    Concurrent misses for one URL share a single scrape. Invalidation drops the
+    URL from this process and from Mongo; other worker processes keep their
+    in-memory copy until it expires.
+    """
+
+    def __init__(self, collection=websites_collection, ttl=SCRAPE_CACHE_TTL, max_items=SCRAPE_CACHE_MEMORY_ITEMS):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_items = max_items
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+
+    def _recall(self, url):
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is None:
+                return None
+            if not is_cache_valid(entry["scraped_at"], self.ttl):
+                del self._memory[url]
+                return None
+            self._memory.move_to_end(url)
+            self.memory_hits += 1
+            return entry
+
+    def _remember(self, url, entry):
+        with self._lock:
+            self._memory[url] = entry
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, url: str, mode: str = None) -> dict:
+        """
+        {"sections", "changes", "fetch_path", "cached", "scraped_at"} for the page,
+        `fetch_path` being "cache" when it wasn't fetched. Scraper errors propagate.
+
+        An explicit `mode` ("auto", "http" or "browser") asks for the page fetched that
+        way: it is scraped instead of served from the cache, and the cache is refreshed.
+        """
+        if mode:
+            return self._flights.do((url, mode), self._load, url, mode, True)
+        entry = self._recall(url)
+        if entry is not None:
+            return {**entry, "fetch_path": "cache", "cached": True}
+        return self._flights.do(url, self._load, url, mode)
+
+    def _load(self, url, mode, refresh=False):
+        try:
+            website_doc = self.collection.find_one({"url": url})
+        except PyMongoError as e:
+            logger.warning("Scrape cache unavailable, scraping %s: %s", url, e)
+            website_doc = None
+        cached_sections = website_doc.get("scrape_data") if website_doc else None
+        if not refresh and cached_sections is not None and is_cache_valid(website_doc.get("scraped_at"), self.ttl):
+            self._count("mongo_hits")
+            entry = {
+                "sections": cached_sections,
+                "changes": website_doc.get("last_changes"),
+                "scraped_at": as_utc(website_doc["scraped_at"]),
+            }
+            self._remember(url, entry)
+            return {**entry, "fetch_path": "cache", "cached": True}
+
+        # Not cached or expired: re-check the page, conditionally when validators are stored.
+        self._count("misses")
+        # Only pages last served over HTTP can be revalidated (older docs stored a JS shell's validators too).
+        revalidate = cached_sections is not None and website_doc.get("fetch_path") == "http"
+        validators = website_doc.get("validators") if revalidate else None
+        page = scrape_page(url, mode, validators)
+        if page.get("not_modified"):
+            self._count("not_modified")
+            data = cached_sections
+            hashes = website_doc.get("section_hashes") or section_hashes(data)
+            changes = no_changes(data)
+        else:
+            data = page["sections"]
+            hashes = section_hashes(data)
+            changes = diff_sections(website_doc.get("section_hashes") if website_doc else {}, hashes)
+
+        scraped_at = datetime.now(timezone.utc)
+        try:
+            self.collection.update_one(
+                {"url": url},
+                {"$set": {
+                    "scrape_data": data,
+                    "section_hashes": hashes,
+                    "validators": page.get("validators") or {},
+                    "last_changes": changes,
+                    "fetch_path": page["fetch_path"],
+                    "load_stats": page.get("load_stats"),
+                    "scraped_at": scraped_at
+                }},
+                upsert=True
+            )
+        except PyMongoError as e:
+            logger.warning("Could not store the scrape of %s: %s", url, e)
+        entry = {"sections": data, "changes": changes, "scraped_at": scraped_at}
+        self._remember(url, entry)
+        return {**entry, "fetch_path": page["fetch_path"], "cached": False}
+
+    def invalidate(self, url: str) -> None:
+        """Forget one page; its validators are dropped too, so the next get renders it afresh."""
+        with self._lock:
+            self._memory.pop(url, None)
+        self.collection.update_one({"url": url}, {"$unset": {"scrape_data": "", "scraped_at": "", "validators": ""}})
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        self.collection.update_many({}, {"$unset": {"scrape_data": "", "scraped_at": "", "validators": ""}})
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.mongo_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "mongo_hits": self.mongo_hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_rate": round((self.memory_hits + self.mongo_hits) / lookups, 3) if lookups else None,
+                "coalesced": self._flights.coalesced,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_scrape_cache() -> ScrapeCache:
+    """Return the process-wide scrape cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ScrapeCache()
+        return _cache
+
+
+def scrape_sections(url: str, mode: str = None) -> list:
+    """The page's sections, through the scrape cache. Callers must not modify them."""
+    return get_scrape_cache().get(url, mode)["sections"]
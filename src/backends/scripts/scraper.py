@@ -1,57 +1,179 @@
 import json
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+import os
+import re
+import requests
+from requests.adapters import HTTPAdapter
+from scripts.browser_pool import get_browser_pool, USER_AGENT
+from scripts.url_utils import url_host
+from scripts.extractor import extract_sections
 
-def scrape_website(url: str) -> str:
+# "auto" tries a plain HTTP GET first and only renders in Chromium when the page needs JavaScript.
+SCRAPE_FETCH_MODE = os.getenv("SCRAPE_FETCH_MODE", "auto")
+HTTP_FETCH_TIMEOUT = float(os.getenv("HTTP_FETCH_TIMEOUT", "10"))
+MIN_STATIC_TEXT_CHARS = int(os.getenv("MIN_STATIC_TEXT_CHARS", "200"))
+
+SPA_MARKERS = [
+    re.compile(r'<div[^>]+id=["\'](root|app|__next|__nuxt|svelte)["\'][^>]*>\s*</div>', re.I),
+    re.compile(r'<app-root[^>]*>\s*</app-root>', re.I),
+    re.compile(r'<noscript[^>]*>[^<]*(enable|requires?)\s+javascript', re.I),
+]
+
+# Lean loading: skip resources that never reach the extracted text and wait for the DOM to settle.
+SCRAPE_LEAN_LOAD = os.getenv("SCRAPE_LEAN_LOAD", "1") == "1"
+BLOCKED_RESOURCE_TYPES = set(filter(None, os.getenv("BLOCKED_RESOURCE_TYPES", "image,font,stylesheet,media").split(",")))
+DOM_QUIET_MS = int(os.getenv("DOM_QUIET_MS", "500"))
+DOM_STABLE_TIMEOUT_MS = int(os.getenv("DOM_STABLE_TIMEOUT_MS", "10000"))
+
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "adservice.google.com", "facebook.net", "connect.facebook.com", "hotjar.com", "segment.com",
+    "segment.io", "mixpanel.com", "clarity.ms", "scorecardresearch.com", "quantserve.com",
+    "newrelic.com", "nr-data.net", "fullstory.com", "intercom.io", "criteo.com", "taboola.com",
+)
+
+# Resolves once no DOM mutation has happened for `quietMs`, or after `timeoutMs` at the latest.
+WAIT_FOR_DOM_STABLE = """
+([quietMs, timeoutMs]) => new Promise(resolve => {
+    let quiet = setTimeout(done, quietMs);
+    const deadline = setTimeout(done, timeoutMs);
+    const observer = new MutationObserver(() => {
+        clearTimeout(quiet);
+        quiet = setTimeout(done, quietMs);
+    });
+    function done() {
+        observer.disconnect();
+        clearTimeout(quiet);
+        clearTimeout(deadline);
+        resolve(true);
+    }
+    observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+})
+"""
+
+http_session = requests.Session()
+http_session.headers.update({
+    "User-Agent": USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+})
+http_session.mount("http://", HTTPAdapter(pool_connections=20, pool_maxsize=20))
+http_session.mount("https://", HTTPAdapter(pool_connections=20, pool_maxsize=20))
+
+def is_tracker(url: str) -> bool:
+    host = url_host(url)
+    return any(host == tracker or host.endswith("." + tracker) for tracker in TRACKER_HOSTS)
+
+def render_page(page, url: str, lean: bool = None):
+    """Render a page in the browser. Returns (html, load_stats)."""
+    lean = SCRAPE_LEAN_LOAD if lean is None else lean
+    stats = {"lean": lean, "requests": 0, "blocked_requests": 0, "blocked_by_type": {}, "bytes_received": 0}
+
+    def on_request(request):
+        stats["requests"] += 1
+
+    def on_response(response):
+        # Only the declared size is available without an extra round-trip per response.
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            stats["bytes_received"] += int(length)
+
+    def block_unneeded(route):
+        request = route.request
+        tracker = is_tracker(request.url)
+        if tracker or request.resource_type in BLOCKED_RESOURCE_TYPES:
+            kind = "tracker" if tracker else request.resource_type
+            stats["blocked_requests"] += 1
+            stats["blocked_by_type"][kind] = stats["blocked_by_type"].get(kind, 0) + 1
+            route.abort()
+        else:
+            route.continue_()
+
+    page.on("request", on_request)
+    page.on("response", on_response)
+
+    if lean:
+        page.route("**/*", block_unneeded)
+        page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        try:
+            page.evaluate(WAIT_FOR_DOM_STABLE, [DOM_QUIET_MS, DOM_STABLE_TIMEOUT_MS])
+        except Exception:
+            print("Warning: DOM did not settle, proceeding...")
+    else:
+        page.goto(url, wait_until="load", timeout=60000)
+
+        try:
+            page.wait_for_load_state("networkidle", timeout=15000)
+        except Exception:
+            print("Warning: Network idle not reached within timeout, proceeding...")
+
+    return page.content(), stats
+
+def fetch_static(url: str, validators: dict = None):
+    """
+    Plain HTTP GET over the pooled session, made conditional when `validators`
+    (a previous response's etag/last_modified) are given.
+    Returns (status_code, html or None if not usable HTML, validators).
+    """
+    headers = {}
+    if validators and validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators and validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    response = http_session.get(url, headers=headers, timeout=HTTP_FETCH_TIMEOUT, allow_redirects=True)
+    if response.status_code == 304:
+        return 304, None, validators
+
+    new_validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    content_type = response.headers.get("Content-Type", "")
+    if response.status_code >= 400 or "html" not in content_type:
+        return response.status_code, None, new_validators
+    # Without a declared charset let the parser sniff <meta charset> from the raw bytes.
+    html = response.text if "charset" in content_type.lower() else response.content
+    return response.status_code, html, new_validators
+
+def needs_javascript(html, sections: list) -> bool:
+    """Heuristic: the static HTML is an app shell or has too little text to be the real page."""
+    text_length = sum(len(section["content"].strip()) for section in sections)
+    if text_length < MIN_STATIC_TEXT_CHARS:
+        return True
+    head = html[:200000] if isinstance(html, str) else html[:200000].decode("utf-8", "ignore")
+    return any(marker.search(head) for marker in SPA_MARKERS)
+
+def scrape_page(url: str, mode: str = None, validators: dict = None) -> dict:
+    """
+    Scrape a page into sections using the cheapest path that works.
+    Returns {"sections": [...], "fetch_path": "http" | "browser", "validators": {...}};
+    browser renders also carry "load_stats" with request and byte counts.
+
+    With `validators` from an earlier scrape the HTTP request is conditional, and an
+    unchanged page returns {"not_modified": True, "sections": None, ...} without rendering.
+    Validators are only returned for pages served over HTTP: a JS shell's ETag says
+    nothing about the content it renders, so browser renders are never revalidated.
+    """
+    mode = mode or SCRAPE_FETCH_MODE
+    if mode in ("auto", "http"):
+        try:
+            status, html, new_validators = fetch_static(url, validators)
+        except requests.RequestException:
+            status, html = None, None
+        if status == 304:
+            return {"not_modified": True, "sections": None, "fetch_path": "http", "validators": validators}
+        if html is not None:
+            sections = extract_sections(html)
+            if mode == "http" or not needs_javascript(html, sections):
+                return {"sections": sections, "fetch_path": "http", "validators": new_validators}
+        elif mode == "http":
+            raise ValueError("Static fetch did not return an HTML page")
+
+    # Pages render on a warm pooled browser instead of launching Chromium per call.
+    html, load_stats = get_browser_pool().run(lambda page: render_page(page, url))
+    return {"sections": extract_sections(html), "fetch_path": "browser", "validators": {}, "load_stats": load_stats}
+
+def scrape_website(url: str, mode: str = None) -> str:
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            page = browser.new_page(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36")
-            
-            page.goto(url, wait_until="load", timeout=60000)
-
-            try:
-                page.wait_for_load_state("networkidle", timeout=15000)
-            except Exception:
-                print("Warning: Network idle not reached within timeout, proceeding...")
-
-            html = page.content()
-            browser.close()
-
-            soup = BeautifulSoup(html, "html.parser")
-
-            # Include <span> in the list of elements to search for
-            elements = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'span'])
-            sections = []
-            current_section = None
-            section_count = 0
-
-            for element in elements:
-                if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    if current_section:
-                        sections.append(current_section)
-                    section_count += 1
-                    current_section = {
-                        "id": f"section_{section_count}",
-                        "content": element.get_text(" ", strip=True),
-                        "links": [{"href": a.get("href"), "content": a.get_text(strip=True)} for a in element.find_all("a", href=True)]
-                    }
-                elif element.name in ["p", "span"]:
-                    if current_section is None:
-                        section_count += 1
-                        current_section = {
-                            "id": f"section_{section_count}",
-                            "content": "",
-                            "links": []
-                        }
-                    current_section["content"] += " " + element.get_text(" ", strip=True)
-                    current_section["links"].extend(
-                        [{"href": a.get("href"), "content": a.get_text(strip=True)} for a in element.find_all("a", href=True)]
-                    )
-
-            if current_section:
-                sections.append(current_section)
-
-            return json.dumps(sections, indent=4)
+        return json.dumps(scrape_page(url, mode)["sections"], indent=4)
     except Exception as e:
         return json.dumps({"error": str(e)})
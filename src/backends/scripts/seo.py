@@ -1,11 +1,10 @@
 import requests
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
+from scripts.llm import generate
 
 load_dotenv()
 
-genai.configure(api_key="GOOGLE_API_KEY")
 LIGHTHOUSE_API_URL = os.getenv("LIGHTHOUSE_API_URL")
 
 def analyze_seo(url: str) -> dict:
@@ -49,11 +48,9 @@ def get_keyword_suggestions(query: str) -> dict:
 
 def optimize_metadata(html: str) -> str:
     """Optimize HTML metadata using Gemini API."""
-    model = genai.GenerativeModel("gemini-2.0-flash")
     prompt = f"Optimize the following HTML metadata for SEO:\n\n{html}"
 
     try:
-        response = model.generate_content([prompt])
-        return response.text.strip()
+        return generate(prompt)
     except Exception as e:
         return f"Gemini API error: {e}"
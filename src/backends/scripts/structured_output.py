@@ -0,0 +1,163 @@
+import dataclasses
+import json
+import os
+from typing import List, Optional
+
+import google.generativeai as genai
+from pydantic import BaseModel, ValidationError
+
+from scripts.llm_executor import generate_as_completed
+
+# Extra rounds for replies that don't match the schema; API errors are retried by the executor instead.
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_RETRIES", "1"))
+
+OPENERS = {"{": "}", "[": "]"}
+
+
+class UpdateAnalysis(BaseModel):
+    outdated: bool
+    reason: str = ""
+    suggestion: Optional[str] = None
+
+
+class Addition(BaseModel):
+    addition: str
+    reason: str = ""
+
+
+class AdditionAnalysis(BaseModel):
+    suggestions: List[Addition]
+
+
+class LinkSuggestion(BaseModel):
+    original: str = ""
+    text: str = ""
+    suggested_replacement: str
+
+
+class StructuredOutputError(ValueError):
+    """The reply held no JSON matching the expected schema."""
+
+
+def json_generation_config():
+    """Generation config asking for a JSON reply, or None when the installed SDK has no JSON mode."""
+    fields = {f.name for f in dataclasses.fields(genai.types.GenerationConfig)}
+    return {"response_mime_type": "application/json"} if "response_mime_type" in fields else None
+
+
+def balanced_spans(text: str, openers=OPENERS) -> list:
+    """
+    (start, end) of every balanced {...} / [...] span whose opener is in `openers`,
+    found in one linear pass. Quotes only count inside brackets, so apostrophes and
+    quotes in surrounding prose don't throw the scan off.
+    """
+    spans, stack = [], []
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"' and stack:
+            in_string = True
+        elif char in OPENERS:
+            stack.append((i, OPENERS[char]))
+        elif char in ("}", "]") and stack:
+            start, closer = stack.pop()
+            if closer != char:
+                # Mismatched brackets: nothing open so far can be valid JSON.
+                stack.clear()
+            elif text[start] in openers:
+                spans.append((start, i + 1))
+    return spans
+
+
+def iter_json(text: str, opener: str = None):
+    """
+    Every outermost JSON value in `text`, decoded, in order. A balanced span that
+    doesn't decode (prose with brackets) gives way to the spans nested inside it.
+    """
+    spans = sorted(balanced_spans(text, {opener: OPENERS[opener]} if opener else OPENERS), key=lambda s: (s[0], -s[1]))
+    covered = -1
+    for start, end in spans:
+        if start < covered:
+            continue
+        try:
+            value = json.loads(text[start:end])
+        except json.JSONDecodeError:
+            continue
+        covered = end
+        yield value
+
+
+def extract_json(text: str, opener: str = None):
+    """The first JSON value in an LLM reply, tolerating markdown fences and surrounding prose."""
+    stripped = text.strip()
+    try:
+        return json.loads(stripped)
+    except json.JSONDecodeError:
+        pass
+    for value in iter_json(stripped, opener):
+        return value
+    raise StructuredOutputError("No JSON found in the response")
+
+
+def validate(model_cls, data, many: bool = False):
+    """`data` checked against the pydantic model, as plain dicts."""
+    if many:
+        if not isinstance(data, list):
+            raise StructuredOutputError("Expected a JSON array")
+        return [validate(model_cls, item) for item in data]
+    try:
+        return model_cls.model_validate(data).model_dump()
+    except ValidationError as e:
+        raise StructuredOutputError(str(e)) from e
+
+
+def parse_structured(text: str, model_cls, many: bool = False):
+    return validate(model_cls, extract_json(text, "[" if many else "{"), many)
+
+
+def repair_prompt(prompt, reply: str, error) -> str:
+    return f"""{prompt}
+
+Your previous reply did not match the required JSON format:
+{reply}
+
+Problem: {error}
+
+Reply again with ONLY the JSON, in exactly the format requested above."""
+
+
+def iter_structured(prompts: list, model_cls, many: bool = False, cancel_event=None, retries: int = STRUCTURED_RETRIES):
+    """
+    Run `prompts` concurrently and yield (index, data, error) as replies arrive,
+    data being validated dicts (a list of them with `many`). Only replies that fail
+    the schema are asked again, with the validation problem quoted; a call that
+    errors out is reported as is.
+    """
+    config = json_generation_config()
+    pending = dict(enumerate(prompts))
+    for attempt in range(retries + 1):
+        last = attempt == retries
+        order = list(pending)
+        repairs = {}
+        for k, reply in generate_as_completed([pending[i] for i in order], cancel_event, generation_config=config):
+            index = order[k]
+            if isinstance(reply, Exception):
+                yield index, None, str(reply)
+                continue
+            try:
+                yield index, parse_structured(reply, model_cls, many), None
+            except StructuredOutputError as e:
+                if last:
+                    yield index, None, f"Invalid structured response: {e}"
+                else:
+                    repairs[index] = repair_prompt(prompts[index], reply, e)
+        if not repairs:
+            return
+        pending = repairs
+
@@ -0,0 +1,32 @@
+from urllib.parse import urljoin, urlparse, urlunparse, urldefrag
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str, base_url: str = None):
+    """
+    Canonical form of a URL for deduplication: absolute, lowercase scheme and
+    host, no fragment and no default port. Returns None for non-http(s) links.
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if base_url:
+        url = urljoin(base_url, url)
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parsed.hostname:
+        return None
+
+    try:
+        port = parsed.port
+    except ValueError:
+        return None
+
+    netloc = parsed.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc = f"{netloc}:{port}"
+    return urlunparse((scheme, netloc, parsed.path or "/", parsed.params, parsed.query, ""))
+
+def url_host(url: str) -> str:
+    return (urlparse(url).hostname or "").lower()